@@ -73,22 +73,59 @@ def load_atmospheric_data():
         st.info("ℹ️ **Atmospheric data unavailable** - Water level will be displayed as absolute pressure readings")
         return pd.DataFrame()
 
-def encode_img_to_base64(image_path):
-    """Encode image to base64 for display"""
+@st.cache_data
+def process_sensor_data(file_path, sensor_height):
+    """Resample, compensate and convert one sensor file once; reruns reuse the result"""
+    df = load_sensor_data(file_path)
+    atmos_df = load_atmospheric_data()
+    
+    # Process data for water level calculation
+    if not atmos_df.empty:
+        # Resample both to 15-min intervals
+        df = df.resample("15min").mean()
+        df = df.dropna(subset=['pressure'])  # Remove rows where sensor has no pressure
+        obs_start, obs_end = df.index.min(), df.index.max()
+
+        atmos_df = atmos_df.resample("15min").mean()
+        atmos_df = atmos_df[obs_start:obs_end]  # Trim atmos to only where OBS has data
+
+        # Inner join
+        df = df.join(atmos_df, how="inner")
+
+        # Remove obvious outliers in pressure which are below 5000
+        df = df[df['pressure'] > 5000]
+
+        # Convert pressure units and compute water level
+        df['hydroP_mbar'] = (df['pressure'] / 10) - (df['atm_pressure'] * 10)
+        df['water_level'] = ((df['hydroP_mbar']) / 98.0665) + sensor_height
+
+    # Add converted columns for display
+    df['pressure_kpa'] = df['pressure'] / 100.0
+    df['water_temp'] = df['water_temp'] / 100.0
+    
+    return df
+
+@st.cache_data
+def month_bins(file_path, sensor_height):
+    """Start of every calendar month that holds at least one processed reading"""
+    # Bins start at the first reading (start_of_bins is the frame's min date), so no slicing is needed;
+    # unique period codes of the sorted index are already ordered and non-empty
+    return process_sensor_data(file_path, sensor_height).index.to_period('M').unique().to_timestamp()
+
+@st.cache_resource
+def header_html(image_path):
+    """Build the page header markup once per process; text-only if the logo is missing"""
     try:
         with open(image_path, "rb") as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
+            logo_base64 = base64.b64encode(f.read()).decode()
     except FileNotFoundError:
-        return ""
-
-# ---------------------------
-# HEADER
-# ---------------------------
-logo_base64 = encode_img_to_base64(LOGO_PATH)
-
-if logo_base64:
-    st.markdown(f"""
+        return """
+        <div style='padding: 20px 10px 10px 10px;'>
+            <h1 style='margin-bottom: 0;'>🌊 S4W Sensor Dashboard</h1>
+            <p style='margin-top: 5px; color: gray;font-size: 18px; font-weight: 500;'>From small sensors to big insights — monitor what matters ❤️</p>
+        </div>
+    """
+    return f"""
         <div style='display: flex; justify-content: space-between; align-items: center; padding: 20px 10px 10px 10px;'>
             <div>
                 <h1 style='margin-bottom: 0;'>🌊 S4W Sensor Dashboard</h1>
@@ -98,14 +135,12 @@ if logo_base64:
                 <img src='data:image/png;base64,{logo_base64}' style='height:100px;'/>
             </div>
         </div>
-    """, unsafe_allow_html=True)
-else:
-    st.markdown("""
-        <div style='padding: 20px 10px 10px 10px;'>
-            <h1 style='margin-bottom: 0;'>🌊 S4W Sensor Dashboard</h1>
-            <p style='margin-top: 5px; color: gray;font-size: 18px; font-weight: 500;'>From small sensors to big insights — monitor what matters ❤️</p>
-        </div>
-    """, unsafe_allow_html=True)
+    """
+
+# ---------------------------
+# HEADER
+# ---------------------------
+st.markdown(header_html(LOGO_PATH), unsafe_allow_html=True)
 
 # ---------------------------
 # SITE & FILE SELECTION
@@ -151,7 +186,6 @@ if selected_file:
     
     # Load supporting data
     metadata_df = load_metadata()
-    atmos_df = load_atmospheric_data()
     
     # Get sensor metadata (height)
     sensor_id = selected_file.split(".")[0]  # e.g., obs_s1_2023
@@ -163,29 +197,8 @@ if selected_file:
         sensor_row = metadata_df[metadata_df['sensor_id'].str.contains(sensor_id)]
         sensor_height = sensor_row['sensor_height_m'].values[0] if not sensor_row.empty else 0.0
 
-    # Process data for water level calculation
-    if not atmos_df.empty:
-        # Resample both to 15-min intervals
-        df = df.resample("15min").mean()
-        df = df.dropna(subset=['pressure'])  # Remove rows where sensor has no pressure
-        obs_start, obs_end = df.index.min(), df.index.max()
-
-        atmos_df = atmos_df.resample("15min").mean()
-        atmos_df = atmos_df[obs_start:obs_end]  # Trim atmos to only where OBS has data
-
-        # Inner join
-        df = df.join(atmos_df, how="inner")
-
-        # Remove obvious outliers in pressure which are below 5000
-        df = df[df['pressure'] > 5000]
-
-        # Convert pressure units and compute water level
-        df['hydroP_mbar'] = (df['pressure'] / 10) - (df['atm_pressure'] * 10)
-        df['water_level'] = ((df['hydroP_mbar']) / 98.0665) + sensor_height
-
-    # Add converted columns for display
-    df['pressure_kpa'] = df['pressure'] / 100.0
-    df['water_temp'] = df['water_temp'] / 100.0
+    # Water level and display columns, computed once per file and sensor height
+    df = process_sensor_data(file_path, sensor_height)
 
     # ---------------------------
     # PARAMETER & TIME SELECTION
@@ -208,8 +221,8 @@ if selected_file:
     if view_mode == "Custom":
         start = st.sidebar.date_input("Start Date", min_value=start_of_bins.date(), value=start_of_bins.date())
         end = st.sidebar.date_input("End Date", min_value=start_of_bins.date(), value=max_date.date())
-        mask = (df.index.date >= start) & (df.index.date <= end)
-        filtered_df = df[mask]
+        # Sorted index, so slice rather than build a per-row date mask
+        filtered_df = df.loc[pd.Timestamp(start):pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')]
     else:
         if view_mode == "Daily":
             st.sidebar.markdown("📅 Select Date:")
@@ -230,8 +243,7 @@ if selected_file:
             delta = timedelta(weeks=1)
         else:  # Monthly
             # Show all months that have timestamps (TB Sensor format)
-            monthly_groups = df[start_of_bins:].groupby(pd.Grouper(freq='MS')).size()
-            bins = monthly_groups[monthly_groups > 0].index
+            bins = month_bins(file_path, sensor_height)
             if len(bins) == 0:
                 st.warning("No data available after filtering. Please adjust your selection.")
                 st.stop()
@@ -241,7 +253,7 @@ if selected_file:
             delta = pd.DateOffset(months=1)
 
         selected_end = selected_bin + delta
-        filtered_df = df[(df.index >= selected_bin) & (df.index < selected_end)]
+        filtered_df = df.loc[selected_bin:selected_end - pd.Timedelta(1, 'ns')]
 
     # ---------------------------
     # PLOTTING & VISUALIZATION
@@ -25,23 +25,26 @@ except Exception as e:
 # ---------------------------
 # CONFIGURATION
 # ---------------------------
-# Emergency cache clearing - clear all caches on startup
-try:
-    st.cache_data.clear()
-    if hasattr(st.cache_resource, 'clear'):
-        st.cache_resource.clear()
-    gc.collect()  # Force garbage collection
-    
-    # Clear session state related to sites and files
-    if 'previous_site' in st.session_state:
-        del st.session_state.previous_site
-    if 'cached_sites' in st.session_state:
-        del st.session_state.cached_sites
-    if 'last_folder_check' in st.session_state:
-        del st.session_state.last_folder_check
+# Emergency cache clearing - clear all caches on startup (once per session, not on
+# every rerun, so the Drive manager's folder listing and downloads are reused)
+if 'startup_cache_cleared' not in st.session_state:
+    st.session_state.startup_cache_cleared = True
+    try:
+        st.cache_data.clear()
+        if hasattr(st.cache_resource, 'clear'):
+            st.cache_resource.clear()
+        gc.collect()  # Force garbage collection
         
-except Exception as e:
-    pass  # Silently handle any cache clearing errors
+        # Clear session state related to sites and files
+        if 'previous_site' in st.session_state:
+            del st.session_state.previous_site
+        if 'cached_sites' in st.session_state:
+            del st.session_state.cached_sites
+        if 'last_folder_check' in st.session_state:
+            del st.session_state.last_folder_check
+            
+    except Exception as e:
+        pass  # Silently handle any cache clearing errors
 
 # Clear cache button in sidebar
 if st.sidebar.button("🗑️ Clear Cache"):
@@ -81,6 +84,8 @@ if st.session_state.emergency_mode:
 if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED and not st.session_state.emergency_mode:
     if st.sidebar.button("🔄 Refresh Sites List"):
         st.cache_data.clear()
+        # The folder listing is cached on the Drive manager, not by st.cache_data
+        get_drive_manager().invalidate_cache()
         gc.collect()
         # Clear session state related to sites
         for key in ['previous_site', 'cached_sites', 'last_folder_check']:
@@ -116,8 +121,8 @@ st.set_page_config(page_title="OBS Sensor", layout="wide")
 # UTILITY FUNCTIONS
 # ---------------------------
 @st.cache_data
-def load_csv_from_drive(file_id):
-    """Load CSV from Google Drive with memory management"""
+def load_csv_from_drive(file_id, modified_time=None):
+    """Load CSV from Google Drive with memory management; with modified_time the download is reused from the on-disk Parquet cache"""
     if not GOOGLE_DRIVE_ENABLED:
         return None
     
@@ -126,7 +131,7 @@ def load_csv_from_drive(file_id):
         if not drive_manager.service:
             drive_manager.authenticate()
         
-        df = drive_manager.download_file(file_id)
+        df = drive_manager.download_file(file_id, modified_time=modified_time)
         if df is not None:
             # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format
             df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
@@ -208,6 +213,7 @@ def load_atmos():
     df = df.set_index('Timestamps').sort_index()
     return df
 
+@st.cache_resource
 def encode_img_to_base64(image_path):
     try:
         with open(image_path, "rb") as f:
@@ -234,7 +240,8 @@ logo_base64 = ""
 if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
     try:
         drive_manager = get_drive_manager()
-        if drive_manager.authenticate():
+        # Resolve the logo in the same batched Drive request as the 'processed' root
+        if drive_manager.authenticate(LOGO_FOLDER_ID):
             logo_base64 = load_logo_from_google_drive(drive_manager, LOGO_FOLDER_ID)
     except Exception as e:
         st.warning(f"⚠️ Could not load logo from Google Drive: {e}")
@@ -323,24 +330,25 @@ if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
                 obs_folders = {name: content for name, content in obs_contents.items() 
                               if content['type'] == 'folder'}
         elif 'processed' in folder_structure and folder_structure['processed']['type'] == 'folder':
-            # Legacy processed structure
-            processed_contents = drive_manager.get_folder_structure(folder_structure['processed']['id'])
+            # Legacy processed structure: resolve just the three folders we need in one query
+            # instead of listing the whole processed tree
+            processed_ids = drive_manager.find_files_by_names(('obs', 'sensor_metadata', 'atmos'), folder_structure['processed']['id'])
             
             # Find OBS folders
-            if 'obs' in processed_contents and processed_contents['obs']['type'] == 'folder':
-                obs_contents = drive_manager.get_folder_structure(processed_contents['obs']['id'])
+            if processed_ids['obs']:
+                obs_contents = drive_manager.get_folder_structure(processed_ids['obs'])
                 obs_folders = {name: content for name, content in obs_contents.items() 
                               if content['type'] == 'folder'}
             
             # Find metadata file
-            if 'sensor_metadata' in processed_contents and processed_contents['sensor_metadata']['type'] == 'folder':
-                metadata_contents = drive_manager.get_folder_structure(processed_contents['sensor_metadata']['id'])
+            if processed_ids['sensor_metadata']:
+                metadata_contents = drive_manager.get_folder_structure(processed_ids['sensor_metadata'])
                 if 'sensor_metadata.csv' in metadata_contents:
                     metadata_file_id = metadata_contents['sensor_metadata.csv']['id']
             
             # Find atmospheric data file
-            if 'atmos' in processed_contents and processed_contents['atmos']['type'] == 'folder':
-                atmos_contents = drive_manager.get_folder_structure(processed_contents['atmos']['id'])
+            if processed_ids['atmos']:
+                atmos_contents = drive_manager.get_folder_structure(processed_ids['atmos'])
                 if 'atm_site1' in atmos_contents and atmos_contents['atm_site1']['type'] == 'folder':
                     atm_site1_contents = drive_manager.get_folder_structure(atmos_contents['atm_site1']['id'])
                     if 'atm_s1_2023.csv' in atm_site1_contents:
@@ -452,7 +460,7 @@ if selected_file:
         # Load data based on source
         if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
             with st.spinner("Loading data from Google Drive..."):
-                df = load_csv_from_drive(selected_file_id)
+                df = load_csv_from_drive(selected_file_id, csv_files[selected_file].get('modifiedTime'))
                 
                 # Load atmospheric data
                 if atmos_file_id:
@@ -534,8 +542,8 @@ if selected_file:
     if view_mode == "Custom":
         start = st.sidebar.date_input("Start Date", min_value=start_of_bins.date(), value=start_of_bins.date())
         end = st.sidebar.date_input("End Date", min_value=start_of_bins.date(), value=max_date.date())
-        mask = (df.index.date >= start) & (df.index.date <= end)
-        filtered_df = df[mask]
+        # Sorted index, so slice rather than build a per-row date mask
+        filtered_df = df.loc[pd.Timestamp(start):pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')]
         bins = [start]
     else:
         if view_mode == "Daily":
@@ -565,7 +573,7 @@ if selected_file:
             delta = pd.DateOffset(months=1)
 
         selected_end = selected_bin + delta
-        filtered_df = df[(df.index >= selected_bin) & (df.index < selected_end)]
+        filtered_df = df.loc[selected_bin:selected_end - pd.Timedelta(1, 'ns')]
 
     # Plotting and download
     st.markdown(f"<h4 style='font-weight: 600;'>📈 Sensor: {sensor_name}</h4>", unsafe_allow_html=True)
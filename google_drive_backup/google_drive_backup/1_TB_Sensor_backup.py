@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
 import plotly.express as px
+import plotly.graph_objects as go
 import os
 from datetime import datetime, timedelta
 import base64
 import gc
+import html
 
 # Import Google Drive utilities
 try:
@@ -22,14 +26,17 @@ except Exception as e:
 # ---------------------------
 # CONFIGURATION
 # ---------------------------
-# Emergency cache clearing - clear all caches on startup
-try:
-    st.cache_data.clear()
-    if hasattr(st.cache_resource, 'clear'):
-        st.cache_resource.clear()
-    gc.collect()  # Force garbage collection
-except Exception as e:
-    pass  # Silently handle any cache clearing errors
+# Emergency cache clearing - clear all caches on startup (once per session, not on
+# every rerun, so the Drive manager's folder listing and downloads are reused)
+if 'startup_cache_cleared' not in st.session_state:
+    st.session_state.startup_cache_cleared = True
+    try:
+        st.cache_data.clear()
+        if hasattr(st.cache_resource, 'clear'):
+            st.cache_resource.clear()
+        gc.collect()  # Force garbage collection
+    except Exception as e:
+        pass  # Silently handle any cache clearing errors
 
 # Clear cache button in sidebar
 if st.sidebar.button("🗑️ Clear Cache"):
@@ -49,6 +56,9 @@ USE_GOOGLE_DRIVE = GOOGLE_DRIVE_ENABLED
 # Google Drive folder IDs
 LOGO_FOLDER_ID = "1IQcw6pn4x9VFIRkafzLbfChbRzfQPz7K"  # Logo assets folder
 
+# Other files of a newly selected site fetched into the Parquet cache in the background
+PREFETCH_FILES = 4
+
 if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
     # Google Drive configuration
     LOGO_PATH = "assets/logo_1.png"  # Relative path for deployment
@@ -59,12 +69,45 @@ else:
 
 st.set_page_config(page_title="🌧️ TB Sensor", page_icon="🌧️", layout="wide")
 
+# read_csv hints so pandas parses the timestamps while reading; the readings are left
+# untyped so _index_by_timestamp can coerce stray text cells to NaN instead of failing
+TB_READ_OPTIONS = {
+    'parse_dates': ['timestamp'],
+    'date_format': '%Y-%m-%d %H:%M:%S',
+}
+# Column types for Arrow's CSV reader on Drive downloads (TB_READ_OPTIONS is the pandas fallback)
+TB_COLUMN_TYPES = {
+    'timestamp': pa.timestamp('s'),
+    'rainfall_mm': pa.float32(),
+    'temperature_c': pa.float32(),
+}
+
+# Resample in separate pieces across gaps longer than this; months, the widest bins, are at most 31 days
+RESAMPLE_GAP_SPLIT = np.timedelta64(32, 'D')
+
 # ---------------------------
 # UTILITY FUNCTIONS
 # ---------------------------
+def _index_by_timestamp(df):
+    """Drop unparseable timestamps and index the frame by time"""
+    # A row in another layout leaves the column unparsed; only then coerce it
+    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    df.dropna(subset=['timestamp'], inplace=True)
+    df.set_index('timestamp', inplace=True)
+    df.sort_index(inplace=True)
+    # Second resolution is all the loggers record; pandas would otherwise keep [us]/[ns]
+    df.index = df.index.astype('datetime64[s]')
+    
+    # Convert empty strings and bad cells to NaN; Arrow-typed columns pass straight through
+    for col in ('rainfall_mm', 'temperature_c'):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    return df
+
 @st.cache_data
-def load_csv_from_drive(file_id):
-    """Load CSV from Google Drive"""
+def load_csv_from_drive(file_id, modified_time=None):
+    """Load CSV from Google Drive; with modified_time the download is reused from the on-disk Parquet cache"""
     if not GOOGLE_DRIVE_ENABLED:
         return None
         
@@ -72,42 +115,59 @@ def load_csv_from_drive(file_id):
     if not drive_manager.service:
         drive_manager.authenticate()
     
-    df = drive_manager.download_file(file_id)
+    df = drive_manager.download_file(file_id, modified_time=modified_time, arrow_types=TB_COLUMN_TYPES, **TB_READ_OPTIONS)
     if df is not None:
         # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-        df.dropna(subset=['timestamp'], inplace=True)
-        df.set_index('timestamp', inplace=True)
-        df.sort_index(inplace=True)
-        
-        # Convert empty strings in rainfall_mm to NaN
-        df['rainfall_mm'] = pd.to_numeric(df['rainfall_mm'], errors='coerce')
-        
-        # Convert temperature_c to numeric if it exists
-        if 'temperature_c' in df.columns:
-            df['temperature_c'] = pd.to_numeric(df['temperature_c'], errors='coerce')
+        df = _index_by_timestamp(df)
     
     return df
 
 @st.cache_data
 def load_csv(file_path):
-    df = pd.read_csv(file_path)
-    # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format
-    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-    df.dropna(subset=['timestamp'], inplace=True)
-    df.set_index('timestamp', inplace=True)
-    df.sort_index(inplace=True)
-    
-    # Convert empty strings in rainfall_mm to NaN
-    df['rainfall_mm'] = pd.to_numeric(df['rainfall_mm'], errors='coerce')
-    
-    # Convert temperature_c to numeric if it exists
-    if 'temperature_c' in df.columns:
-        df['temperature_c'] = pd.to_numeric(df['temperature_c'], errors='coerce')
-    
-    return df
+    # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format; empty cells read as NaN
+    return _index_by_timestamp(pd.read_csv(file_path, **TB_READ_OPTIONS))
+
+@st.cache_data(ttl=60)
+def list_sites(base_path):
+    """List site folders; scandir's d_type avoids a stat() per entry"""
+    return [e.name for e in os.scandir(base_path) if e.is_dir(follow_symlinks=False) and not e.name.startswith('.')]
+
+@st.cache_data(ttl=60)
+def list_csvs(site_path):
+    """List CSV files in a site folder"""
+    return [e.name for e in os.scandir(site_path) if e.name.endswith('.csv') and not e.name.startswith('.')]
+
+def load_source(source):
+    """Load the selected file: ('drive', file_id, modified_time) or ('local', file_path)"""
+    if source[0] == 'drive':
+        return load_csv_from_drive(source[1], source[2])
+    return load_csv(source[1])
+
+def resample_column(series, rule, how):
+    """Bin a series with pandas' built-in sum/mean; empty bins come out NaN so gaps still show"""
+    # Split at gaps longer than any bin (e.g. a stray epoch-0 timestamp) so no bins are
+    # allocated across them; callers reindex onto their own range, restoring those as NaN
+    breaks = np.flatnonzero(np.diff(series.index.values) > RESAMPLE_GAP_SPLIT)
+    if len(breaks):
+        bounds = np.r_[0, breaks + 1, len(series)]
+        return pd.concat([resample_column(series.iloc[a:b], rule, how) for a, b in zip(bounds[:-1], bounds[1:])])
+    resampled = series.resample(rule)
+    # min_count=1 keeps an all-missing rainfall bin NaN instead of 0
+    binned = resampled.sum(min_count=1) if how == "sum" else resampled.mean()
+    return binned.to_frame()
 
 @st.cache_data
+def prebin(source, column, rule, how):
+    """Resample one column of the whole file once; views slice the cached bins"""
+    return resample_column(load_source(source)[column], rule, how)
+
+@st.cache_data
+def time_bins(source, period):
+    """Start of every calendar period ('M' or 'Y') that holds at least one reading"""
+    # Unique period codes of the sorted index are already ordered and non-empty
+    return load_source(source).index.to_period(period).unique().to_timestamp()
+
+@st.cache_resource
 def encode_img_to_base64(image_path):
     try:
         with open(image_path, "rb") as f:
@@ -144,13 +204,172 @@ def load_logo_from_google_drive(gd_manager, logo_folder_id, logo_filename="logo_
     
     return ""
 
-def get_summary_stats(df, view_mode, plot_df, agg_type=None):
+
+@st.cache_data(max_entries=32)
+def build_figure(plot_df, data_column, data_type, view_mode, time_title):
+    """Build the TB plot; plot_df is the small binned frame, so hashing it is cheap and
+    reruns that don't change the selection (e.g. a download click) reuse the cached figure"""
+    # For rainfall, create cumulative; for temperature, don't
+    if data_type == "Rainfall":
+        # Calculate cumulative rainfall on a float32 buffer; NaN bins stay NaN so gaps remain visible
+        rainfall = plot_df[data_column].to_numpy(np.float32)
+        # A dry or fully missing period has nothing to accumulate: skip the second trace and axis
+        show_cumulative = np.nanmax(rainfall, initial=0) > 0
+        if show_cumulative:
+            cumulative_rainfall = np.nancumsum(rainfall)
+            cumulative_rainfall[np.isnan(rainfall)] = np.nan
+    else:
+        show_cumulative = False
+    
+    # Create the appropriate plot type
+    if data_type == "Rainfall":
+        # Bar chart for rainfall - gaps will show as missing bars
+        fig = px.bar(
+            plot_df, y=data_column,
+            title=time_title,
+            labels={data_column: f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})", "index": "Time"},
+            template="plotly_white",
+            color_discrete_sequence=["#1f77b4"]
+        )
+    else:
+        # Line chart for temperature - gaps will show as disconnected lines
+        fig = px.line(
+            plot_df, y=data_column,
+            title=time_title,
+            labels={data_column: f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})", "index": "Time"},
+            template="plotly_white",
+            color_discrete_sequence=["#1f77b4"],  # Same blue as rainfall
+            render_mode="webgl"
+        )
+        # Add markers to the line and ensure gaps are not connected
+        fig.update_traces(mode='lines+markers', connectgaps=False)
+    
+    # Calculate y-axis max (higher than highest value)
+    max_data = plot_df[data_column].max()
+    
+    if pd.isna(max_data):
+        max_data = 1
+        
+    # For temperature, calculate proper y-axis range
+    if data_type == "Temperature":
+        min_data = plot_df[data_column].min()
+        if not pd.isna(min_data):
+            # If all temperatures are positive, start from 0
+            if min_data >= 0:
+                y_min = 0
+                y_max = max_data * 1.2  # 20% padding above max
+            else:
+                # If there are negative temperatures, add padding below min
+                y_min = min_data * 1.2  # 20% padding below min (makes it more negative)
+                y_max = max_data * 1.2  # 20% padding above max
+        else:
+            y_min = 0
+            y_max = 1
+    else:
+        # For rainfall, keep existing logic
+        if max_data == 0:
+            max_data = 1
+        y_min = 0
+        y_max = max_data * 1.2  # 20% padding above max value
+    
+    # Add cumulative rainfall line only for rainfall data
+    if show_cumulative:
+        max_cumulative = np.nanmax(cumulative_rainfall, initial=0)
+        if max_cumulative == 0:
+            max_cumulative = 1
+        y2_max = max_cumulative * 1.2
+        
+        fig.add_trace(go.Scattergl(
+            x=plot_df.index.values, 
+            y=cumulative_rainfall, 
+            mode="lines+markers",
+            name="Cumulative Rainfall", 
+            line=dict(color="#00509E"),
+            yaxis="y2",
+            connectgaps=False  # This ensures gaps are visible in the cumulative line
+        ))
+    
+    # Update layout - dual y-axis for rainfall, single for temperature
+    if show_cumulative:
+        # Dual y-axis layout for rainfall
+        fig.update_layout(
+            yaxis=dict(
+                title=f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})",
+                side="left",
+                showgrid=True,
+                gridwidth=1,
+                gridcolor='lightgray',
+                range=[y_min, y_max]
+            ),
+            yaxis2=dict(
+                title="Cumulative Rainfall (mm)",
+                side="right",
+                overlaying="y",
+                showgrid=False,
+                range=[0, y2_max]
+            ),
+            xaxis_title="Date" if view_mode in ["Monthly", "Yearly"] else "Time",
+            height=400,
+            hovermode='x unified',
+            legend=dict(
+                x=1.08,  # Move legend further right to avoid secondary y-axis
+                y=0.5,   # Center vertically
+                xanchor='left',
+                yanchor='middle'
+            )
+        )
+    else:
+        # Single y-axis layout for temperature
+        fig.update_layout(
+            yaxis=dict(
+                title=f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})",
+                showgrid=True,
+                gridwidth=1,
+                gridcolor='lightgray',
+                range=[y_min, y_max]
+            ),
+            xaxis_title="Date" if view_mode in ["Monthly", "Yearly"] else "Time",
+            height=400,
+            hovermode='x unified'
+        )
+    
+    # Special x-axis formatting for different view modes
+    if view_mode == "Monthly":
+        # Show all dates from first to last day of month
+        fig.update_xaxes(
+            dtick="D1",  # Show every day
+            tickformat="%d",  # Show day numbers
+            tickmode="linear",
+            range=[plot_df.index.min(), plot_df.index.max()]  # Limit to actual month range
+        )
+    elif view_mode == "Yearly":
+        # Show all months
+        fig.update_xaxes(
+            dtick="M1",  # Show every month
+            tickformat="%b",  # Show month abbreviations
+            tickmode="linear",
+            range=[plot_df.index.min(), plot_df.index.max()]  # Limit to actual year range
+        )
+
+    return fig
+
+def _longest_run_of_zeros(values):
+    """Length of the longest run of zeros, from the gaps between non-zero positions"""
+    nonzero = np.flatnonzero(values != 0)
+    return int((np.diff(np.r_[-1, nonzero, len(values)]) - 1).max())
+
+@st.cache_data(max_entries=64)
+def get_summary_stats(_df, view_mode, plot_df, agg_type=None, has_missing=None):
     """
     Calculate comprehensive summary statistics for the given data.
     Returns None if there's missing data in the plot data, otherwise returns stats dict.
+    Pass has_missing when the caller has already scanned plot_df for NaN.
+    Cached on the small binned plot_df; the unused raw slice (_df) is not hashed.
     """
     # Check if there are any missing values in the plot data (following original guide)
-    if plot_df[plot_df.columns[0]].isna().any():
+    if has_missing is None:
+        has_missing = plot_df[plot_df.columns[0]].isna().any()
+    if has_missing:
         return None
     
     stats = {}
@@ -169,63 +388,46 @@ def get_summary_stats(df, view_mode, plot_df, agg_type=None):
     elif view_mode == "Monthly":
         # Monthly: Total, Max daily, Wet-dry days, Dry spell, Average
         if 'rainfall_mm' in plot_df.columns:
-            stats["Total rainfall (mm)"] = round(plot_df['rainfall_mm'].sum(), 2)
-            stats["Max daily rainfall (mm)"] = round(plot_df['rainfall_mm'].max(), 2)
-            stats["Wet days"] = (plot_df['rainfall_mm'] > 0).sum()
-            stats["Dry days"] = (plot_df['rainfall_mm'] == 0).sum()
+            # Every statistic reads the same raw array; the wet mask is built once and reused
+            daily = plot_df['rainfall_mm'].to_numpy()
+            wet = daily > 0
+            stats["Total rainfall (mm)"] = round(np.nansum(daily), 2)
+            stats["Max daily rainfall (mm)"] = round(np.nanmax(daily), 2)
+            stats["Wet days"] = wet.sum()
+            stats["Dry days"] = (daily == 0).sum()
             
             # Calculate longest dry spell (consecutive days with no rain)
-            rainfall_series = plot_df['rainfall_mm']
-            max_dry_spell = 0
-            current_dry = 0
-            for val in rainfall_series:
-                if val == 0:
-                    current_dry += 1
-                    max_dry_spell = max(max_dry_spell, current_dry)
-                else:
-                    current_dry = 0
-            stats["Longest dry spell (days)"] = max_dry_spell
+            stats["Longest dry spell (days)"] = _longest_run_of_zeros(daily)
             
             # Average from non-zero values only
-            non_zero_vals = plot_df['rainfall_mm'][plot_df['rainfall_mm'] > 0]
-            avg_rainfall = non_zero_vals.mean() if len(non_zero_vals) > 0 else 0
-            stats["Average daily rainfall (mm)"] = round(avg_rainfall, 2) if avg_rainfall > 0 else 0
+            stats["Average daily rainfall (mm)"] = round(daily[wet].mean(), 2) if wet.any() else 0
         
     elif view_mode == "Yearly":
         # Yearly: Annual total, Wettest month, Dry months, Wet-dry days, Longest dry spell
         if 'rainfall_mm' in plot_df.columns:
-            stats["Annual total (mm)"] = round(plot_df['rainfall_mm'].sum(), 2)
+            monthly = plot_df['rainfall_mm'].to_numpy()
+            stats["Annual total (mm)"] = round(np.nansum(monthly), 2)
             
             # Wettest month
-            if plot_df['rainfall_mm'].max() > 0:
-                wettest = plot_df['rainfall_mm'].idxmax()
-                wettest_value = round(plot_df['rainfall_mm'].max(), 2)
-                stats["Wettest month"] = f"{wettest.strftime('%B')} ({wettest_value} mm)"
+            if np.nanmax(monthly, initial=0) > 0:
+                # One pass over the raw array gives both the position and the value
+                wettest = int(np.nanargmax(monthly))
+                wettest_value = round(float(monthly[wettest]), 2)
+                stats["Wettest month"] = f"{plot_df.index[wettest].strftime('%B')} ({wettest_value} mm)"
             else:
                 stats["Wettest month"] = "N/A"
                 
-            stats["Dry months"] = (plot_df['rainfall_mm'] == 0).sum()
-            stats["Wet months"] = (plot_df['rainfall_mm'] > 0).sum()
+            stats["Dry months"] = (monthly == 0).sum()
+            stats["Wet months"] = (monthly > 0).sum()
             
             # Longest dry spell in days (convert from monthly data)
             # For yearly view, we need to estimate days from months
-            rainfall_series = plot_df['rainfall_mm']
-            max_dry_spell_months = 0
-            current_dry = 0
-            for val in rainfall_series:
-                if val == 0:
-                    current_dry += 1
-                    max_dry_spell_months = max(max_dry_spell_months, current_dry)
-                else:
-                    current_dry = 0
+            max_dry_spell_months = _longest_run_of_zeros(monthly)
             # Convert months to approximate days (30 days per month)
             stats["Longest dry spell (days)"] = max_dry_spell_months * 30
         
     elif view_mode == "Custom":
-        # For custom view, follow original guide - check for any missing data
-        if plot_df[plot_df.columns[0]].isna().any():
-            return None
-            
+        # For custom view, follow original guide - missing data was already ruled out above
         if 'rainfall_mm' in plot_df.columns:
             stats["Total rainfall (mm)"] = round(plot_df['rainfall_mm'].sum(), 2)
             stats["Max rainfall (mm)"] = round(plot_df['rainfall_mm'].max(), 2)
@@ -234,6 +436,14 @@ def get_summary_stats(df, view_mode, plot_df, agg_type=None):
     
     return stats
 
+def stats_table_html(stats):
+    """Render the summary stats as a plain two-column HTML table (no Arrow round trip for a few rows)"""
+    rows = "".join(
+        f"<tr><td>{html.escape(str(name))}</td><td style='text-align: right;'>{html.escape(str(value))}</td></tr>"
+        for name, value in stats.items()
+    )
+    return f"<table style='width: 100%;'><tr><th></th><th style='text-align: right;'>Value</th></tr>{rows}</table>"
+
 # ---------------------------
 # LOGO HEADER
 # ---------------------------
@@ -243,7 +453,8 @@ logo_base64 = ""
 if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
     try:
         drive_manager = get_drive_manager()
-        if drive_manager.authenticate():
+        # Resolve the logo in the same batched Drive request as the 'processed' root
+        if drive_manager.authenticate(LOGO_FOLDER_ID):
             logo_base64 = load_logo_from_google_drive(drive_manager, LOGO_FOLDER_ID)
     except Exception as e:
         st.warning(f"⚠️ Could not load logo from Google Drive: {e}")
@@ -288,6 +499,10 @@ if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
             st.sidebar.error("❌ Failed to connect to Google Drive")
             st.stop()
     
+    # The listing is cached on the manager; re-read it from Drive only on request
+    if st.sidebar.button("🔄 Refresh Drive listing"):
+        drive_manager.invalidate_cache()
+    
     # Get folder structure
     with st.spinner("Loading Google Drive folder structure..."):
         folder_structure = drive_manager.get_folder_structure()
@@ -334,13 +549,22 @@ if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
     selected_file = st.sidebar.selectbox("📂 Select data file", csv_file_names)
     selected_file_id = csv_files[selected_file]['id']
     
+    # Once per site and session, warm the disk cache with the site's most recently
+    # modified other files so switching to them doesn't wait on Drive
+    prefetch_key = f"prefetched_{selected_site}"
+    if prefetch_key not in st.session_state:
+        st.session_state[prefetch_key] = True
+        others = sorted((f for f in csv_files.values() if f['id'] != selected_file_id),
+                        key=lambda f: f.get('modifiedTime') or '', reverse=True)[:PREFETCH_FILES]
+        drive_manager.prefetch_files([(f['id'], f.get('modifiedTime')) for f in others], arrow_types=TB_COLUMN_TYPES, **TB_READ_OPTIONS)
+    
 else:
     # Local file selection (fallback)
-    sites = [d for d in os.listdir(TB_PATH) if os.path.isdir(os.path.join(TB_PATH, d)) and not d.startswith('.')]
+    sites = list_sites(TB_PATH)
     selected_site = st.sidebar.selectbox("🌍 Select TB Site", sites)
 
     site_path = os.path.join(TB_PATH, selected_site)
-    csv_files = [f for f in os.listdir(site_path) if f.endswith('.csv') and not f.startswith('.')]
+    csv_files = list_csvs(site_path)
     selected_file = st.sidebar.selectbox("📂 Select data file", csv_files)
 
 # ---------------------------
@@ -349,13 +573,15 @@ else:
 if selected_file:
     # Load data based on source
     if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
+        source = ('drive', selected_file_id, csv_files[selected_file].get('modifiedTime'))
         with st.spinner("Loading data from Google Drive..."):
-            df = load_csv_from_drive(selected_file_id)
+            df = load_source(source)
         if df is None:
             st.error("Failed to load data from Google Drive")
             st.stop()
     else:
-        df = load_csv(os.path.join(site_path, selected_file))
+        source = ('local', os.path.join(site_path, selected_file))
+        df = load_source(source)
     
     sensor_id = selected_file.replace(".csv", "")
 
@@ -373,42 +599,33 @@ if selected_file:
     # Set column name and aggregation function based on data type
     if data_type == "Rainfall":
         data_column = 'rainfall_mm'
-        agg_func = lambda x: x.sum() if (len(x) > 0 and x.notna().any()) else None
+        agg_how = "sum"
     else:  # Temperature
         data_column = 'temperature_c'
-        agg_func = lambda x: x.mean() if (len(x) > 0 and x.notna().any()) else None
+        agg_how = "mean"
 
     if view_mode == "Custom":
         start = st.sidebar.date_input("Start Date", min_value=min_date.date(), value=min_date.date())
         end = st.sidebar.date_input("End Date", min_value=min_date.date(), value=max_date.date())
-        mask = (df.index.date >= start) & (df.index.date <= end)
-        filtered_df = df[mask]
+        # The index is sorted, so .loc slices by binary search; the end day is inclusive
+        filtered_df = df.loc[pd.Timestamp(start):pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')]
         
         # Determine aggregation based on date range
         date_diff = (end - start).days
         if date_diff <= 7:
             # Create continuous hourly index and reindex with NaN for missing periods
             full_range = pd.date_range(start=pd.Timestamp(start), end=pd.Timestamp(end) + pd.Timedelta(days=1), freq='h', inclusive='left')
-            hourly_data = filtered_df.resample('H').agg({
-                data_column: agg_func
-            })
-            plot_df = hourly_data.reindex(full_range)
+            plot_df = prebin(source, data_column, 'h', agg_how).reindex(full_range)
             freq_text = "Hourly"
         elif date_diff <= 90:
             # Create continuous daily index
             full_range = pd.date_range(start=start, end=end, freq='D')
-            daily_data = filtered_df.resample('D').agg({
-                data_column: agg_func
-            })
-            plot_df = daily_data.reindex(full_range)
+            plot_df = prebin(source, data_column, 'D', agg_how).reindex(full_range)
             freq_text = "Daily"
         else:
-            # Create continuous monthly index
+            # Create continuous monthly index; the first month is partial, so bin the selection itself
             full_range = pd.date_range(start=pd.Timestamp(start).replace(day=1), end=pd.Timestamp(end), freq='MS')
-            monthly_data = filtered_df.resample('MS').agg({
-                data_column: agg_func
-            })
-            plot_df = monthly_data.reindex(full_range)
+            plot_df = resample_column(filtered_df[data_column], 'MS', agg_how).reindex(full_range)
             freq_text = "Monthly"
         
         time_title = f"{start.strftime('%b %d, %Y')} to {end.strftime('%b %d, %Y')} ({freq_text})"
@@ -428,8 +645,7 @@ if selected_file:
             delta = timedelta(days=1)
         elif view_mode == "Monthly":
             # Show all months that have timestamps (including those with missing rainfall data)
-            monthly_groups = df.groupby(pd.Grouper(freq='MS')).size()
-            bins = monthly_groups[monthly_groups > 0].index
+            bins = time_bins(source, 'M')
             # Format bins for better display
             bin_options = [f"{bin.strftime('%Y %B')}" for bin in bins]
             selected_bin_str = st.sidebar.selectbox("📆 Select month:", bin_options)
@@ -438,33 +654,25 @@ if selected_file:
             delta = pd.DateOffset(months=1)
         else:  # Yearly
             # Show all years that have timestamps (show year only)
-            yearly_groups = df.groupby(pd.Grouper(freq='YS')).size()
-            bins = yearly_groups[yearly_groups > 0].index
-            # Format bins to show year only
-            year_options = [bin.strftime('%Y') for bin in bins]
-            selected_year_str = st.sidebar.selectbox("📆 Select year:", year_options)
-            # Convert back to timestamp
-            selected_bin = bins[year_options.index(selected_year_str)]
+            # Plain int years keep the widget's options cheap to hash on every rerun
+            years = time_bins(source, 'Y').year.tolist()
+            selected_year = st.sidebar.selectbox("📆 Select year:", years)
+            selected_bin = pd.Timestamp(year=selected_year, month=1, day=1)
             delta = pd.DateOffset(years=1)
 
         selected_end = selected_bin + delta
-        filtered_df = df[(df.index >= selected_bin) & (df.index < selected_end)]
+        filtered_df = df.loc[selected_bin:selected_end - pd.Timedelta(1, 'ns')]
 
         if view_mode == "Daily":
             # Create continuous time index for the selected day
             agg = st.sidebar.radio("Aggregation:", ["15-min", "Hourly"])
             freq = "15min" if agg == "15-min" else "h"
             
-            # Create full continuous range for the selected day
-            start_time = selected_bin
-            end_time = selected_bin + timedelta(days=1)
-            full_range = pd.date_range(start=start_time, end=end_time, freq=freq, inclusive='left')
+            # Create full continuous range for the selected day (a fixed count of slots)
+            full_range = pd.date_range(start=selected_bin, periods=96 if agg == "15-min" else 24, freq=freq)
             
-            # Aggregate and reindex to show missing periods as NaN
-            aggregated_data = filtered_df.resample(freq).agg({
-                data_column: agg_func
-            })
-            plot_df = aggregated_data.reindex(full_range)
+            # Slice the cached file-wide bins; missing periods reindex to NaN
+            plot_df = prebin(source, data_column, freq, agg_how).reindex(full_range)
             
             # Create title
             interval_text = "15 min interval" if agg == "15-min" else "one hour interval"
@@ -472,33 +680,18 @@ if selected_file:
             time_title = f"{data_type} {unit} (Daily: {selected_bin.strftime('%B %d, %Y')} - {interval_text})"
         elif view_mode == "Monthly":
             # Create continuous daily index for the selected month
-            start_date = selected_bin
-            if selected_bin.month == 12:
-                end_date = selected_bin.replace(year=selected_bin.year+1, month=1, day=1)
-            else:
-                end_date = selected_bin.replace(month=selected_bin.month+1, day=1)
-            
-            full_range = pd.date_range(start=start_date, end=end_date, freq='D', inclusive='left')
+            full_range = pd.date_range(start=selected_bin, periods=selected_bin.days_in_month, freq='D')
             
-            # Aggregate and reindex to show missing periods as NaN
-            aggregated_data = filtered_df.resample('D').agg({
-                data_column: agg_func
-            })
-            plot_df = aggregated_data.reindex(full_range)
+            # Slice the cached file-wide bins; missing periods reindex to NaN
+            plot_df = prebin(source, data_column, 'D', agg_how).reindex(full_range)
             unit = "(mm)" if data_type == "Rainfall" else "(°C)"
             time_title = f"{data_type} {unit} (Monthly: {selected_bin.strftime('%B %Y')})"
         else:  # Yearly
             # Create continuous monthly index for the selected year
-            start_date = selected_bin
-            end_date = selected_bin.replace(year=selected_bin.year+1)
-            
-            full_range = pd.date_range(start=start_date, end=end_date, freq='MS', inclusive='left')
+            full_range = pd.date_range(start=selected_bin, periods=12, freq='MS')
             
-            # Aggregate and reindex to show missing periods as NaN
-            aggregated_data = filtered_df.resample('MS').agg({
-                data_column: agg_func
-            })
-            plot_df = aggregated_data.reindex(full_range)
+            # Slice the cached file-wide bins; missing periods reindex to NaN
+            plot_df = prebin(source, data_column, 'MS', agg_how).reindex(full_range)
             unit = "(mm)" if data_type == "Rainfall" else "(°C)"
             time_title = f"{data_type} {unit} (Yearly: {selected_bin.strftime('%Y')})"
 
@@ -511,149 +704,14 @@ if selected_file:
         st.warning("No data available for the selected time period.")
     else:
         # Check for missing data and show warning if found
-        has_missing_data = plot_df.isna().any().any()
+        has_missing_data = bool(plot_df[data_column].isna().any())
         if has_missing_data:
             if data_type == "Temperature":
                 st.warning("⚠️ Some data points are missing for this period. Gaps will be visible in the plot.")
             else:
                 st.warning("⚠️ Some data points are missing for this period. Gaps will be visible in the plot.")
 
-        # For rainfall, create cumulative; for temperature, don't
-        if data_type == "Rainfall":
-            # Calculate cumulative rainfall - cumsum() naturally handles NaN values
-            plot_df['cumulative_rainfall'] = plot_df[data_column].cumsum()
-            show_cumulative = True
-        else:
-            show_cumulative = False
-        
-        # Create the appropriate plot type
-        if data_type == "Rainfall":
-            # Bar chart for rainfall - gaps will show as missing bars
-            fig = px.bar(
-                plot_df, y=data_column,
-                title=time_title,
-                labels={data_column: f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})", "index": "Time"},
-                template="plotly_white",
-                color_discrete_sequence=["#1f77b4"]
-            )
-        else:
-            # Line chart for temperature - gaps will show as disconnected lines
-            fig = px.line(
-                plot_df, y=data_column,
-                title=time_title,
-                labels={data_column: f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})", "index": "Time"},
-                template="plotly_white",
-                color_discrete_sequence=["#1f77b4"]  # Same blue as rainfall
-            )
-            # Add markers to the line and ensure gaps are not connected
-            fig.update_traces(mode='lines+markers', connectgaps=False)
-        
-        # Calculate y-axis max (higher than highest value)
-        max_data = plot_df[data_column].max()
-        
-        if pd.isna(max_data):
-            max_data = 1
-            
-        # For temperature, calculate proper y-axis range
-        if data_type == "Temperature":
-            min_data = plot_df[data_column].min()
-            if not pd.isna(min_data):
-                # If all temperatures are positive, start from 0
-                if min_data >= 0:
-                    y_min = 0
-                    y_max = max_data * 1.2  # 20% padding above max
-                else:
-                    # If there are negative temperatures, add padding below min
-                    y_min = min_data * 1.2  # 20% padding below min (makes it more negative)
-                    y_max = max_data * 1.2  # 20% padding above max
-            else:
-                y_min = 0
-                y_max = 1
-        else:
-            # For rainfall, keep existing logic
-            if max_data == 0:
-                max_data = 1
-            y_min = 0
-            y_max = max_data * 1.2  # 20% padding above max value
-        
-        # Add cumulative rainfall line only for rainfall data
-        if show_cumulative:
-            max_cumulative = plot_df['cumulative_rainfall'].max()
-            if pd.isna(max_cumulative) or max_cumulative == 0:
-                max_cumulative = 1
-            y2_max = max_cumulative * 1.2
-            
-            fig.add_scatter(
-                x=plot_df.index, 
-                y=plot_df['cumulative_rainfall'], 
-                mode="lines+markers",
-                name="Cumulative Rainfall", 
-                line=dict(color="#00509E"),
-                yaxis="y2",
-                connectgaps=False  # This ensures gaps are visible in the cumulative line
-            )
-        
-        # Update layout - dual y-axis for rainfall, single for temperature
-        if show_cumulative:
-            # Dual y-axis layout for rainfall
-            fig.update_layout(
-                yaxis=dict(
-                    title=f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})",
-                    side="left",
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='lightgray',
-                    range=[y_min, y_max]
-                ),
-                yaxis2=dict(
-                    title="Cumulative Rainfall (mm)",
-                    side="right",
-                    overlaying="y",
-                    showgrid=False,
-                    range=[0, y2_max]
-                ),
-                xaxis_title="Date" if view_mode in ["Monthly", "Yearly"] else "Time",
-                height=400,
-                hovermode='x unified',
-                legend=dict(
-                    x=1.08,  # Move legend further right to avoid secondary y-axis
-                    y=0.5,   # Center vertically
-                    xanchor='left',
-                    yanchor='middle'
-                )
-            )
-        else:
-            # Single y-axis layout for temperature
-            fig.update_layout(
-                yaxis=dict(
-                    title=f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})",
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='lightgray',
-                    range=[y_min, y_max]
-                ),
-                xaxis_title="Date" if view_mode in ["Monthly", "Yearly"] else "Time",
-                height=400,
-                hovermode='x unified'
-            )
-        
-        # Special x-axis formatting for different view modes
-        if view_mode == "Monthly":
-            # Show all dates from first to last day of month
-            fig.update_xaxes(
-                dtick="D1",  # Show every day
-                tickformat="%d",  # Show day numbers
-                tickmode="linear",
-                range=[plot_df.index.min(), plot_df.index.max()]  # Limit to actual month range
-            )
-        elif view_mode == "Yearly":
-            # Show all months
-            fig.update_xaxes(
-                dtick="M1",  # Show every month
-                tickformat="%b",  # Show month abbreviations
-                tickmode="linear",
-                range=[plot_df.index.min(), plot_df.index.max()]  # Limit to actual year range
-            )
+        fig = build_figure(plot_df, data_column, data_type, view_mode, time_title)
 
         st.plotly_chart(fig, use_container_width=True)
 
@@ -665,17 +723,14 @@ if selected_file:
             agg_type = None
             if view_mode == "Daily" and 'agg' in locals():
                 agg_type = agg
-            stats = get_summary_stats(filtered_df, view_mode, plot_df, agg_type)
+            stats = get_summary_stats(filtered_df, view_mode, plot_df, agg_type, has_missing=has_missing_data)
             
             if stats is None:
                 # Show warning for incomplete data
                 st.warning("⚠️ Data is incomplete for this period. Summary statistics are not available.")
             else:
                 st.markdown("### 📊 Summary Statistics")
-                # Create DataFrame with explicit string dtype to avoid Arrow issues
-                stats_df = pd.DataFrame(stats, index=["Value"]).T
-                stats_df = stats_df.astype(str)  # Ensure all values are strings
-                st.dataframe(stats_df, use_container_width=True)
+                st.markdown(stats_table_html(stats), unsafe_allow_html=True)
 
         # ---------------------------
         # DOWNLOAD OPTIONS
@@ -686,10 +741,10 @@ if selected_file:
         html_filename = f"{sensor_id}_{view_mode}_{time_title.replace(' ', '_').replace(',', '').replace(':', '_').replace('(', '').replace(')', '')}.html"
         
         try:
-            html_string = fig.to_html(include_plotlyjs='cdn')
+            # Encode straight away so only the bytes outlive this call, not a str copy too
             st.download_button(
                 "📄 Download Interactive HTML Plot", 
-                html_string.encode(), 
+                fig.to_html(include_plotlyjs='cdn').encode(), 
                 file_name=html_filename, 
                 mime="text/html",
                 help="Download interactive HTML plot file."
@@ -1,11 +1,20 @@
 # HOBO Sensor - Google Drive Version
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 import os
 from datetime import datetime, timedelta
 import base64
 import gc
+import sys
+
+# hobo_data.py sits at the repository root, two levels above this page
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+from hobo_data import downcast as _downcast, m4_indices
 
 # Import Google Drive utilities
 try:
@@ -18,14 +27,17 @@ except ImportError:
 # ---------------------------
 # CONFIGURATION
 # ---------------------------
-# Emergency cache clearing - clear all caches on startup
-try:
-    st.cache_data.clear()
-    if hasattr(st.cache_resource, 'clear'):
-        st.cache_resource.clear()
-    gc.collect()  # Force garbage collection
-except Exception as e:
-    pass  # Silently handle any cache clearing errors
+# Emergency cache clearing - clear all caches on startup (once per session, not on
+# every rerun, so the Drive manager's folder listing and downloads are reused)
+if 'startup_cache_cleared' not in st.session_state:
+    st.session_state.startup_cache_cleared = True
+    try:
+        st.cache_data.clear()
+        if hasattr(st.cache_resource, 'clear'):
+            st.cache_resource.clear()
+        gc.collect()  # Force garbage collection
+    except Exception as e:
+        pass  # Silently handle any cache clearing errors
 
 # Clear cache button in sidebar
 if st.sidebar.button("🗑️ Clear Cache"):
@@ -45,6 +57,9 @@ USE_GOOGLE_DRIVE = GOOGLE_DRIVE_ENABLED
 # Google Drive folder IDs
 LOGO_FOLDER_ID = "1IQcw6pn4x9VFIRkafzLbfChbRzfQPz7K"  # Logo assets folder
 
+# Other files of a newly selected site fetched into the Parquet cache in the background
+PREFETCH_FILES = 4
+
 if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
     # Google Drive configuration
     LOGO_PATH = "assets/logo_1.png"  # Relative path for deployment
@@ -56,12 +71,17 @@ else:
 
 st.set_page_config(page_title="🌡️ HOBO Sensor", page_icon="🌡️", layout="wide")
 
+# Above this many points a parameter is thinned with M4 before it is plotted
+MAX_PLOT_POINTS = 5000
+
 # ---------------------------
 # UTILITY FUNCTIONS
 # ---------------------------
-@st.cache_data
-def load_csv_from_drive(file_id):
-    """Load CSV from Google Drive"""
+# The parsed frames are served by reference: cache_data would pickle and copy the whole
+# frame on every rerun. Callers must not modify them in place (see water_level_m below)
+@st.cache_resource
+def load_csv_from_drive(file_id, modified_time=None):
+    """Load CSV from Google Drive; with modified_time the download is reused from the on-disk Parquet cache"""
     if not GOOGLE_DRIVE_ENABLED:
         return None
         
@@ -69,17 +89,18 @@ def load_csv_from_drive(file_id):
     if not drive_manager.service:
         drive_manager.authenticate()
     
-    df = drive_manager.download_file(file_id)
+    df = drive_manager.download_file(file_id, modified_time=modified_time)
     if df is not None:
         # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format
         df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
         df.dropna(subset=['timestamp'], inplace=True)
         df.set_index('timestamp', inplace=True)
         df.sort_index(inplace=True)
+        df = _downcast(df)
     
     return df
 
-@st.cache_data
+@st.cache_resource
 def load_csv(file_path):
     df = pd.read_csv(file_path)
     # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format
@@ -87,7 +108,7 @@ def load_csv(file_path):
     df.dropna(subset=['timestamp'], inplace=True)
     df.set_index('timestamp', inplace=True)
     df.sort_index(inplace=True)
-    return df
+    return _downcast(df)
 
 @st.cache_data
 def load_metadata_from_drive(file_id):
@@ -106,6 +127,26 @@ def load_metadata():
     return pd.read_csv(SENSOR_METADATA_PATH)
 
 @st.cache_data
+def sensor_heights(metadata_df):
+    """Map sensor_id -> sensor_height_m, built once per metadata table"""
+    if metadata_df is None or metadata_df.empty:
+        return {}
+    return dict(zip(metadata_df['sensor_id'].astype(str), metadata_df['sensor_height_m'].astype(float)))
+
+# The frame itself is not hashed; data_key identifies the loaded file
+@st.cache_data
+def week_bins(_df, data_key):
+    """Monday starting every week that holds at least one reading, computed once instead of per rerun"""
+    # Left-labelled, left-closed bins so each label is exactly the start of the [Mon, next Mon) window the page slices
+    counts = _df.resample('W-MON', label='left', closed='left').size()
+    return counts[counts > 0].index
+
+@st.cache_data
+def month_bins(_df, data_key):
+    """Start of every month that holds at least one reading"""
+    return _df.index.to_period('M').unique().to_timestamp()
+
+@st.cache_resource
 def encode_img_to_base64(image_path):
     try:
         with open(image_path, "rb") as f:
@@ -151,7 +192,8 @@ logo_base64 = ""
 if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
     try:
         drive_manager = get_drive_manager()
-        if drive_manager.authenticate():
+        # Resolve the logo in the same batched Drive request as the 'processed' root
+        if drive_manager.authenticate(LOGO_FOLDER_ID):
             logo_base64 = load_logo_from_google_drive(drive_manager, LOGO_FOLDER_ID)
     except Exception as e:
         st.warning(f"⚠️ Could not load logo from Google Drive: {e}")
@@ -192,6 +234,10 @@ if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
             st.sidebar.error("❌ Failed to connect to Google Drive")
             st.stop()
     
+    # The listing is cached on the manager; re-read it from Drive only on request
+    if st.sidebar.button("🔄 Refresh Drive listing"):
+        drive_manager.invalidate_cache()
+    
     # Get folder structure
     with st.spinner("Loading Google Drive folder structure..."):
         folder_structure = drive_manager.get_folder_structure()
@@ -211,18 +257,19 @@ if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
             hobo_folders = {name: content for name, content in hobo_contents.items() 
                            if content['type'] == 'folder'}
     elif 'processed' in folder_structure and folder_structure['processed']['type'] == 'folder':
-        # Legacy processed structure
-        processed_contents = drive_manager.get_folder_structure(folder_structure['processed']['id'])
+        # Legacy processed structure: resolve just the two folders we need in one query
+        # instead of listing the whole processed tree
+        processed_ids = drive_manager.find_files_by_names(('hobo', 'sensor_metadata'), folder_structure['processed']['id'])
         
         # Find HOBO folders
-        if 'hobo' in processed_contents and processed_contents['hobo']['type'] == 'folder':
-            hobo_contents = drive_manager.get_folder_structure(processed_contents['hobo']['id'])
+        if processed_ids['hobo']:
+            hobo_contents = drive_manager.get_folder_structure(processed_ids['hobo'])
             hobo_folders = {name: content for name, content in hobo_contents.items() 
                            if content['type'] == 'folder'}
         
         # Find metadata file
-        if 'sensor_metadata' in processed_contents and processed_contents['sensor_metadata']['type'] == 'folder':
-            metadata_contents = drive_manager.get_folder_structure(processed_contents['sensor_metadata']['id'])
+        if processed_ids['sensor_metadata']:
+            metadata_contents = drive_manager.get_folder_structure(processed_ids['sensor_metadata'])
             if 'sensor_metadata.csv' in metadata_contents:
                 metadata_file_id = metadata_contents['sensor_metadata.csv']['id']
     
@@ -247,6 +294,15 @@ if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
     selected_file = st.sidebar.selectbox("📂 Select data file", csv_file_names)
     selected_file_id = csv_files[selected_file]['id']
     
+    # Once per site and session, warm the disk cache with the site's most recently
+    # modified other files so switching to them doesn't wait on Drive
+    prefetch_key = f"prefetched_{selected_site}"
+    if prefetch_key not in st.session_state:
+        st.session_state[prefetch_key] = True
+        others = sorted((f for f in csv_files.values() if f['id'] != selected_file_id),
+                        key=lambda f: f.get('modifiedTime') or '', reverse=True)[:PREFETCH_FILES]
+        drive_manager.prefetch_files([(f['id'], f.get('modifiedTime')) for f in others])
+    
 else:
     # Local file selection (fallback)
     sites = [d for d in os.listdir(HOBO_PATH) if os.path.isdir(os.path.join(HOBO_PATH, d)) and not d.startswith('.')]
@@ -263,7 +319,8 @@ if selected_file:
     # Load data based on source
     if USE_GOOGLE_DRIVE and GOOGLE_DRIVE_ENABLED:
         with st.spinner("Loading data from Google Drive..."):
-            df = load_csv_from_drive(selected_file_id)
+            data_key = (selected_file_id, csv_files[selected_file].get('modifiedTime'))
+            df = load_csv_from_drive(*data_key)
             if metadata_file_id:
                 metadata_df = load_metadata_from_drive(metadata_file_id)
             else:
@@ -272,17 +329,18 @@ if selected_file:
             st.error("Failed to load data from Google Drive")
             st.stop()
     else:
-        df = load_csv(os.path.join(site_path, selected_file))
+        data_key = os.path.join(site_path, selected_file)
+        df = load_csv(data_key)
         metadata_df = load_metadata()
 
     sensor_id = selected_file.replace(".csv", "")
     
     # Get sensor height from metadata
-    sensor_height = 0.0
-    if not metadata_df.empty:
-        metadata_df['sensor_id'] = metadata_df['sensor_id'].astype(str)
-        sensor_row = metadata_df[metadata_df['sensor_id'].str.contains(sensor_id)]
-        sensor_height = sensor_row['sensor_height_m'].values[0] if not sensor_row.empty else 0.0
+    heights = sensor_heights(metadata_df)
+    sensor_height = heights.get(sensor_id)
+    if sensor_height is None:
+        # Fall back to a partial match for metadata ids that extend the file name
+        sensor_height = next((h for sid, h in heights.items() if sensor_id in sid), 0.0)
 
     # Parameter display mapping
     param_display = {
@@ -293,7 +351,8 @@ if selected_file:
 
     # Calculate water level from pressure if not available
     if 'water_level_m' not in df.columns and 'pressure_psi' in df.columns:
-        df['water_level_m'] = ((df['pressure_psi'] * 6.89476) / 98.0665) + sensor_height
+        # assign() keeps the shared cached frame untouched
+        df = df.assign(water_level_m=((df['pressure_psi'] * 6.89476) / 98.0665) + sensor_height)
 
     st.sidebar.markdown("### 📌 Parameters")
     available_params = [p for p in param_display if p in df.columns]
@@ -308,8 +367,8 @@ if selected_file:
     if view_mode == "Custom":
         start = st.sidebar.date_input("Start Date", min_value=min_date.date(), value=min_date.date())
         end = st.sidebar.date_input("End Date", min_value=min_date.date(), value=max_date.date())
-        mask = (df.index.date >= start) & (df.index.date <= end)
-        filtered_df = df[mask]
+        # The index is sorted, so .loc slices by binary search; the end day is inclusive
+        filtered_df = df.loc[pd.Timestamp(start):pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')]
         time_title = f"{start.strftime('%b %d, %Y')} to {end.strftime('%b %d, %Y')}"
     else:
         if view_mode == "Daily":
@@ -324,16 +383,16 @@ if selected_file:
             selected_bin = pd.Timestamp(selected_date)
             delta = timedelta(days=1)
         elif view_mode == "Weekly":
-            bins = df.resample('W-MON').mean().index
+            bins = week_bins(df, data_key)
             selected_bin = st.sidebar.selectbox("📆 Select week:", bins)
             delta = timedelta(weeks=1)
         else:  # Monthly
-            bins = df.resample('MS').mean().index
+            bins = month_bins(df, data_key)
             selected_bin = st.sidebar.selectbox("📆 Select month:", bins)
             delta = pd.DateOffset(months=1)
 
         selected_end = selected_bin + delta
-        filtered_df = df[(df.index >= selected_bin) & (df.index < selected_end)]
+        filtered_df = df.loc[selected_bin:selected_end - pd.Timedelta(1, 'ns')]
 
         if view_mode == "Monthly":
             time_title = selected_bin.strftime("%B %Y")
@@ -348,8 +407,12 @@ if selected_file:
         st.warning("Please select at least one parameter.")
     else:
         for param in selected_params:
+            plot_df = filtered_df
+            if len(filtered_df) > MAX_PLOT_POINTS:
+                # M4 keeps every peak and trough at chart width while ~4 points per pixel reach the browser
+                plot_df = filtered_df.iloc[m4_indices(filtered_df.index, filtered_df[param].to_numpy(np.float64))]
             fig = px.line(
-                filtered_df,
+                plot_df,
                 y=param,
                 title=f"{param_display[param]} ({time_title})",
                 labels={"value": param_display[param]},
@@ -358,13 +421,18 @@ if selected_file:
             fig.update_layout(xaxis_title="Time", yaxis_title=param_display[param], height=400)
             st.plotly_chart(fig, use_container_width=True)
 
+            # The chart may show the M4-thinned line; the downloaded HTML keeps every sample
+            export_fig = fig
+            if plot_df is not filtered_df:
+                export_fig = go.Figure(fig).update_traces(x=filtered_df.index, y=filtered_df[param].to_numpy())
+
             # HTML Download only
             html_filename = f"{sensor_id}_{view_mode}_{param}.html"
             try:
-                html_string = fig.to_html(include_plotlyjs='cdn')
+                # Encode straight away so only the bytes outlive this call, not a str copy too
                 st.download_button(
                     f"📄 Download {param_display[param]} as HTML",
-                    html_string.encode(), 
+                    export_fig.to_html(include_plotlyjs='cdn').encode(), 
                     file_name=html_filename, 
                     mime="text/html",
                     key=f"html_{param}",
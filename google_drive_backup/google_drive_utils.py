@@ -1,75 +1,189 @@
 import streamlit as st
 import pandas as pd
-import io
 import json
+import base64
 import os
+import functools
+import hashlib
+import fnmatch
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import google_auth_httplib2
+from google.auth.exceptions import GoogleAuthError
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from googleapiclient.errors import HttpError
 
+# Optional: Arrow's multithreaded CSV reader for downloads with known column types
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# Large enough that most CSVs arrive in one range request, small enough that a
+# dropped connection only re-fetches one chunk
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+# Retries (with exponential backoff) for each chunk request
+DOWNLOAD_NUM_RETRIES = 5
+# In-memory limit for a downloaded CSV before it is spooled to a temp file
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+# Socket timeout for Drive HTTP connections
+HTTP_TIMEOUT = 30
+
+# Shared keep-alive session for the GitHub logo fallback
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                                       max_retries=Retry(total=3, backoff_factor=0.3)))
+
+# Seconds a folder/file lookup result is reused before asking Drive again
+LOOKUP_CACHE_TTL = 600
+
+# Parsed CSVs are kept as Parquet here, keyed by Drive file id + modifiedTime
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "hydro_link")
+# Cache files not read for this many days are removed when a manager starts
+CACHE_MAX_AGE_DAYS = 14
+
+# read_csv hints per processed file name pattern, so pandas can skip dtype inference.
+# Timestamps are left to the pages, which coerce mixed formats themselves.
+SCHEMA = {
+    'tb_s*.csv': {'dtype': {'rainfall_mm': 'float64', 'temperature_c': 'float64'}},
+    'hobo_s*.csv': {'dtype': {'pressure_psi': 'float64', 'water_temp_c': 'float64'}},
+    'obs_s*.csv': {'dtype': {'ambient_light': 'float64', 'backscatter': 'float64', 'pressure': 'float64',
+                             'water_temp': 'float64', 'battery': 'float64'}},
+}
+
+def schema_for(file_name):
+    """Return the read_csv keyword arguments registered for a file name (empty if none match)"""
+    for pattern, kwargs in SCHEMA.items():
+        if fnmatch.fnmatch(file_name, pattern):
+            return dict(kwargs)
+    return {}
+
+@functools.lru_cache(maxsize=1)
+def _load_local_sa():
+    """Read and parse the local service_account.json once per process"""
+    with open('service_account.json', 'r') as f:
+        return json.load(f)
+
+def _q_escape(value):
+    """Escape a value for use inside a single-quoted Drive query string"""
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+def _b64encode_chunks(chunks):
+    """Base64-encode a stream of byte chunks without joining the raw bytes first"""
+    parts = []
+    carry = b""
+    for chunk in chunks:
+        data = carry + chunk
+        # Encode whole 3-byte groups only so the pieces concatenate cleanly
+        cut = len(data) - len(data) % 3
+        parts.append(base64.b64encode(data[:cut]))
+        carry = data[cut:]
+    parts.append(base64.b64encode(carry))
+    return b"".join(parts).decode()
+
+def _ttl_cached(method):
+    """Memoize a lookup method per manager for LOOKUP_CACHE_TTL seconds (empty results are not cached)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        hit = self._lookup_cache.get(key)
+        if hit and now - hit[0] < LOOKUP_CACHE_TTL:
+            return hit[1]
+        value = method(self, *args, **kwargs)
+        if value:
+            self._lookup_cache[key] = (now, value)
+        return value
+    return wrapper
+
 class GoogleDriveManager:
-    def __init__(self):
+    def __init__(self, chunksize=DOWNLOAD_CHUNK_SIZE, num_retries=DOWNLOAD_NUM_RETRIES):
         self.SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
         self.service = None
+        self.chunksize = chunksize
+        self.num_retries = num_retries
+        self._processed_root_id = None
+        # folder_id -> (timestamp, structure dict) from get_folder_structure, kept LOOKUP_CACHE_TTL seconds
+        self._structure_cache = {}
+        # (method, args) -> (timestamp, result) for _ttl_cached lookups
+        self._lookup_cache = {}
+        self._creds = None
+        self._creds_dict = None
+        self._service_account_email = None
+        # (folder_id, filename) -> base64 logo
+        self._logo_cache = {}
+        self._thread_local = threading.local()
+        self._evict_parquet_cache()
         
-    def authenticate(self):
-        """Authenticate with Google Drive API using Service Account"""
-        try:
-            creds_dict = None
+    def _load_creds_dict(self):
+        """Read the service account info once from secrets or the local file (None if absent)"""
+        if self._creds_dict is None:
             # Try to get credentials from Streamlit secrets (for cloud deployment)
             if hasattr(st, 'secrets') and 'google_drive' in st.secrets:
-                creds_dict = dict(st.secrets["google_drive"])
-                creds = service_account.Credentials.from_service_account_info(creds_dict, scopes=self.SCOPES)
+                self._creds_dict = dict(st.secrets["google_drive"])
             # Fallback to service_account key (alternative naming)
             elif hasattr(st, 'secrets') and 'service_account' in st.secrets:
-                creds_dict = dict(st.secrets["service_account"])
-                creds = service_account.Credentials.from_service_account_info(creds_dict, scopes=self.SCOPES)
+                self._creds_dict = dict(st.secrets["service_account"])
             # Fallback to local service account file (for local development)
             elif os.path.exists('service_account.json'):
-                creds = service_account.Credentials.from_service_account_file('service_account.json', scopes=self.SCOPES)
-                # Also load the dict for email display
-                with open('service_account.json', 'r') as f:
-                    creds_dict = json.load(f)
-            else:
-                return False
-            
-            self.service = build('drive', 'v3', credentials=creds)
-            
-            # Store credentials for display (after successful authentication)
-            if creds_dict and 'client_email' in creds_dict:
-                self._service_account_email = creds_dict['client_email']
-            
+                self._creds_dict = _load_local_sa()
+        return self._creds_dict
+    
+    def authenticate(self, logo_folder_id=None, logo_filename="logo_1.png"):
+        """Authenticate with Google Drive API using Service Account
+        
+        With logo_folder_id, the logo file id is resolved in the same batched
+        request as the 'processed' root, so load_logo_from_drive skips a lookup.
+        """
+        if self.service is not None:
             return True
-            
-        except Exception as e:
+        
+        try:
+            creds_dict = self._load_creds_dict()
+            if creds_dict is None:
+                return False
+            creds = service_account.Credentials.from_service_account_info(creds_dict, scopes=self.SCOPES)
+        except (OSError, ValueError, GoogleAuthError):
+            # Unreadable key file, malformed JSON/secrets or invalid key material
             return False
+        
+        self._creds = creds
+        self.service = self._build_service()
+        
+        # Store credentials for display (after successful authentication)
+        self._service_account_email = creds_dict.get('client_email', "Not available")
+        
+        # Resolve the 'processed' root once; it does not change during a session
+        if logo_folder_id:
+            self._processed_root_id, _ = self._batch_find([
+                ('find_folder_by_name', ('processed',)),
+                ('find_file_by_name', (logo_filename, logo_folder_id)),
+            ])
+        else:
+            self._processed_root_id = self.find_folder_by_name('processed')
+        
+        return True
     
     def get_service_account_email(self):
         """Get the service account email for display purposes"""
-        try:
-            if hasattr(self, '_service_account_email'):
-                return self._service_account_email
-            
-            # Try to get from secrets if available
-            if hasattr(st, 'secrets') and 'google_drive' in st.secrets:
-                creds_dict = dict(st.secrets["google_drive"])
-                if 'client_email' in creds_dict:
-                    return creds_dict['client_email']
-            elif hasattr(st, 'secrets') and 'service_account' in st.secrets:
-                creds_dict = dict(st.secrets["service_account"])
-                if 'client_email' in creds_dict:
-                    return creds_dict['client_email']
-            elif os.path.exists('service_account.json'):
-                with open('service_account.json', 'r') as f:
-                    creds_dict = json.load(f)
-                    if 'client_email' in creds_dict:
-                        return creds_dict['client_email']
-            
-            return "Not available"
-            
-        except Exception as e:
-            return "Not available"
+        if self._service_account_email is None:
+            try:
+                creds_dict = self._load_creds_dict() or {}
+                self._service_account_email = creds_dict.get('client_email', "Not available")
+            except Exception as e:
+                return "Not available"
+        return self._service_account_email
     
     def list_files_in_folder(self, folder_id):
         """List all files in a specific Google Drive folder"""
@@ -80,7 +194,7 @@ class GoogleDriveManager:
             # Get all files in the folder
             results = self.service.files().list(
                 q=f"'{folder_id}' in parents and trashed=false",
-                fields="files(id, name, mimeType, parents)",
+                fields="files(id, name, mimeType, modifiedTime)",
                 pageSize=1000  # Increase page size for better performance
             ).execute()
             
@@ -92,30 +206,199 @@ class GoogleDriveManager:
             st.error(f"❌ Unexpected error: {e}")
             return []
     
-    def download_file(self, file_id):
-        """Download a file from Google Drive and return as pandas DataFrame"""
-        if not self.service:
-            return None
-            
-        try:
-            # Download file content
-            request = self.service.files().get_media(fileId=file_id)
-            file_content = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_content, request)
+    def _fetch_csv(self, service, file_id, arrow_types=None, **read_csv_kwargs):
+        """Download a CSV with the given service client and parse it into a DataFrame"""
+        # Small CSVs stay in memory; anything over 32 MiB spills to disk instead of
+        # sitting in RAM next to the parsed DataFrame
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as file_content:
+            request = service.files().get_media(fileId=file_id)
+            downloader = MediaIoBaseDownload(file_content, request, chunksize=self.chunksize)
             
             done = False
             while done is False:
-                status, done = downloader.next_chunk()
-                
+                status, done = downloader.next_chunk(num_retries=self.num_retries)
+            
             file_content.seek(0)
             
-            # Convert to pandas DataFrame
-            df = pd.read_csv(file_content)
-            return df
+            if arrow_types and ARROW_AVAILABLE:
+                # Typed single pass in Arrow; a file that doesn't match the types goes through pandas
+                try:
+                    convert_options = pa_csv.ConvertOptions(column_types=arrow_types)
+                    return pa_csv.read_csv(file_content, convert_options=convert_options).to_pandas()
+                except pa.ArrowInvalid:
+                    file_content.seek(0)
             
+            # Convert to pandas DataFrame
+            read_csv_kwargs.setdefault('engine', 'c')
+            read_csv_kwargs.setdefault('low_memory', False)
+            return pd.read_csv(file_content, **read_csv_kwargs)
+    
+    def _build_service(self):
+        """Build a Drive v3 client from the discovery document bundled with
+        google-api-python-client (no HTTPS fetch, nothing written to the file cache)"""
+        return build('drive', 'v3', http=self._authorized_http(), cache_discovery=False, static_discovery=True)
+    
+    def _authorized_http(self):
+        """Create a keep-alive HTTP transport signed with our credentials (one per thread)"""
+        return google_auth_httplib2.AuthorizedHttp(self._creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    
+    def _thread_service(self):
+        """Return a Drive client owned by the current thread (httplib2 is not thread-safe)"""
+        service = getattr(self._thread_local, 'service', None)
+        if service is None:
+            service = self._build_service()
+            self._thread_local.service = service
+        return service
+    
+    def _fetch_csv_in_thread(self, file_id, read_csv_kwargs):
+        """Worker body for download_files"""
+        return self._fetch_csv(self._thread_service(), file_id, **read_csv_kwargs)
+    
+    def download_file(self, file_id, dtype=None, usecols=None, parse_dates=None, modified_time=None,
+                      arrow_types=None, **read_csv_kwargs):
+        """Download a file from Google Drive and return as pandas DataFrame
+        
+        dtype/usecols/parse_dates (and any other read_csv keyword) are passed to
+        pandas; see SCHEMA / schema_for() for the hints of the processed files.
+        With arrow_types (column -> pyarrow type) the CSV is parsed by pyarrow
+        instead, falling back to pandas if a value doesn't fit its type.
+        When modified_time (the file's Drive modifiedTime) is given, the parsed
+        frame is cached on disk as Parquet and reused until the file changes.
+        """
+        if not self.service:
+            return None
+        
+        if dtype is not None:
+            read_csv_kwargs['dtype'] = dtype
+        if usecols is not None:
+            read_csv_kwargs['usecols'] = usecols
+        if parse_dates is not None:
+            read_csv_kwargs['parse_dates'] = parse_dates
+        
+        cache_path = None
+        if modified_time:
+            cache_path = self._parquet_cache_path(file_id, modified_time, self._cache_key_kwargs(arrow_types, read_csv_kwargs))
+            df = self._read_parquet_cache(cache_path)
+            if df is not None:
+                return df
+        
+        try:
+            df = self._fetch_csv(self.service, file_id, arrow_types=arrow_types, **read_csv_kwargs)
         except HttpError as e:
             st.error(f"❌ Error downloading file from Google Drive: {e}")
             return None
+        
+        if cache_path:
+            self._write_parquet_cache(df, cache_path)
+        return df
+    
+    def _cache_key_kwargs(self, arrow_types, read_csv_kwargs):
+        """Parse options that identify a cached frame (arrow_types only when used)"""
+        return dict(read_csv_kwargs, arrow_types=arrow_types) if arrow_types else read_csv_kwargs
+    
+    def _parquet_cache_path(self, file_id, modified_time, read_csv_kwargs):
+        """Cache file for one version of a Drive file parsed with the given read_csv options"""
+        key = hashlib.sha1(repr((modified_time, sorted(read_csv_kwargs.items()))).encode()).hexdigest()[:16]
+        return os.path.join(CACHE_DIR, f"{file_id}_{key}.parquet")
+    
+    def _read_parquet_cache(self, cache_path):
+        """Load a cached frame, or None on a miss (or if Parquet support is unavailable)"""
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            df = pd.read_parquet(cache_path)
+            # Touch the file so the age-based sweep keeps recently used entries
+            os.utime(cache_path)
+            return df
+        except Exception:
+            return None
+    
+    def _write_parquet_cache(self, df, cache_path):
+        """Best-effort write of a parsed frame to the Parquet cache"""
+        # Per process and thread: a background prefetch may write while the page does
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            # No pyarrow, read-only home, unsupported column types... just skip caching
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    
+    def _evict_parquet_cache(self):
+        """Remove cache files that have not been used for CACHE_MAX_AGE_DAYS"""
+        cutoff = time.time() - CACHE_MAX_AGE_DAYS * 86400
+        try:
+            with os.scandir(CACHE_DIR) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+        except OSError:
+            pass
+    
+    def prefetch_files(self, files, max_workers=4, arrow_types=None, **read_csv_kwargs):
+        """Warm the Parquet cache for (file_id, modified_time) pairs on a background thread
+        
+        Parse options must match the later download_file calls so the entries are hit.
+        Returns the started thread, or None if everything is already cached.
+        """
+        if not self.service:
+            return None
+        
+        key_kwargs = self._cache_key_kwargs(arrow_types, read_csv_kwargs)
+        jobs = []
+        for file_id, modified_time in files:
+            if modified_time:
+                cache_path = self._parquet_cache_path(file_id, modified_time, key_kwargs)
+                if not os.path.exists(cache_path):
+                    jobs.append((file_id, cache_path))
+        if not jobs:
+            return None
+        
+        def run():
+            with ThreadPoolExecutor(max_workers=min(len(jobs), max_workers)) as executor:
+                for file_id, cache_path in jobs:
+                    executor.submit(self._prefetch_file, file_id, cache_path, arrow_types, read_csv_kwargs)
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+    
+    def _prefetch_file(self, file_id, cache_path, arrow_types, read_csv_kwargs):
+        """Worker body for prefetch_files (no Streamlit calls: it runs outside the script thread)"""
+        try:
+            df = self._fetch_csv(self._thread_service(), file_id, arrow_types=arrow_types, **read_csv_kwargs)
+        except Exception:
+            # Best effort; the page downloads the file itself if it is picked
+            return
+        self._write_parquet_cache(df, cache_path)
+    
+    def download_files(self, file_ids, max_workers=10, **read_csv_kwargs):
+        """Download several CSV files concurrently and return {file_id: DataFrame or None}"""
+        if not self.service:
+            return {file_id: None for file_id in file_ids}
+        
+        results = {}
+        errors = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._fetch_csv_in_thread, file_id, read_csv_kwargs): file_id
+                for file_id in file_ids
+            }
+            for future in as_completed(futures):
+                file_id = futures[future]
+                try:
+                    results[file_id] = future.result()
+                except HttpError as e:
+                    results[file_id] = None
+                    errors.append(e)
+        
+        # Report from the main thread; Streamlit calls are not safe inside workers
+        for e in errors:
+            st.error(f"❌ Error downloading file from Google Drive: {e}")
+        
+        return results
     
     def download_image_file(self, file_id):
         """Download an image file from Google Drive and return as bytes"""
@@ -123,17 +406,8 @@ class GoogleDriveManager:
             return None
             
         try:
-            # Download file content
-            request = self.service.files().get_media(fileId=file_id)
-            file_content = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_content, request)
-            
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                
-            file_content.seek(0)
-            return file_content.read()
+            # Images are tiny, so fetch the whole body in a single request
+            return self.service.files().get_media(fileId=file_id).execute(num_retries=self.num_retries)
             
         except HttpError as e:
             st.error(f"❌ Error downloading image from Google Drive: {e}")
@@ -142,16 +416,48 @@ class GoogleDriveManager:
             st.error(f"❌ Error processing file: {e}")
             return None
     
+    def _cached_structure(self, folder_id):
+        """Return the cached structure of a folder, or None if it was never listed or has expired"""
+        hit = self._structure_cache.get(folder_id)
+        if hit is None:
+            return None
+        if time.monotonic() - hit[0] >= LOOKUP_CACHE_TTL:
+            # Same lifetime as the _ttl_cached lookups, so new or renamed files show up
+            del self._structure_cache[folder_id]
+            return None
+        return hit[1]
+    
+    def _cached_entry_id(self, name, folder_id, entry_type):
+        """Return the id of a child already seen by get_folder_structure, if any"""
+        entry = (self._cached_structure(folder_id) or {}).get(name)
+        if entry and entry['type'] == entry_type:
+            return entry['id']
+        return None
+    
+    def clear_structure_cache(self, folder_id=None):
+        """Forget cached folder structures (all of them, or just one folder)"""
+        if folder_id is None:
+            self._structure_cache.clear()
+        else:
+            self._structure_cache.pop(folder_id, None)
+    
+    def invalidate_cache(self):
+        """Drop all memoized lookups and folder structures (e.g. from a refresh button)"""
+        self._lookup_cache.clear()
+        self.clear_structure_cache()
+    
+    @_ttl_cached
     def find_folder_by_name(self, folder_name, parent_folder_id=None):
         """Find a folder by name, optionally within a parent folder"""
-        try:
-            query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-            if parent_folder_id:
-                query += f" and '{parent_folder_id}' in parents"
+        if parent_folder_id:
+            cached_id = self._cached_entry_id(folder_name, parent_folder_id, 'folder')
+            if cached_id:
+                return cached_id
             
+        try:
             results = self.service.files().list(
-                q=query,
-                fields="files(id, name)",
+                q=self._name_query(folder_name, parent_folder_id, folder=True),
+                fields="files(id)",
                 pageSize=10
             ).execute()
             
@@ -162,14 +468,84 @@ class GoogleDriveManager:
             st.error(f"❌ Error finding folder '{folder_name}': {e}")
             return None
     
+    @staticmethod
+    def _name_query(name, parent_id=None, folder=False):
+        """Drive query for an item by exact name, optionally a folder and/or under a parent"""
+        query = f"name='{_q_escape(name)}'"
+        if folder:
+            query += " and mimeType='application/vnd.google-apps.folder'"
+        query += " and trashed=false"
+        if parent_id:
+            query += f" and '{parent_id}' in parents"
+        return query
+    
+    def _batch_find(self, lookups):
+        """Answer several find_folder_by_name/find_file_by_name calls with one
+        multipart/mixed batch request; results land in the lookup cache too
+        
+        lookups is a list of (method_name, args) pairs; returns the ids in order (None if not found).
+        """
+        results = [None] * len(lookups)
+        
+        def on_response(request_id, response, exception):
+            if exception is None:
+                files = response.get('files', [])
+                results[int(request_id)] = files[0]['id'] if files else None
+        
+        batch = self.service.new_batch_http_request(callback=on_response)
+        for i, (method, args) in enumerate(lookups):
+            name, parent_id = (tuple(args) + (None,))[:2]
+            batch.add(self.service.files().list(
+                q=self._name_query(name, parent_id, folder=(method == 'find_folder_by_name')),
+                fields="files(id)",
+                pageSize=10
+            ), request_id=str(i))
+        
+        try:
+            batch.execute()
+        except Exception:
+            # Fall back to one request per lookup
+            return [getattr(self, method)(*args) for method, args in lookups]
+        
+        now = time.monotonic()
+        for (method, args), value in zip(lookups, results):
+            if value:
+                # Same key _ttl_cached uses, so the regular methods hit it
+                self._lookup_cache[(method, tuple(args), ())] = (now, value)
+        return results
+    
+    def _find_nested_folder(self, folder_name, preferred_parent_ids):
+        """Find a folder anywhere in My Drive or shared drives, preferring one under the given parents"""
+        query = f"name='{_q_escape(folder_name)}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        try:
+            results = self.service.files().list(
+                q=query,
+                corpora='allDrives',
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                fields="files(id, parents)",
+                pageSize=100
+            ).execute()
+        except Exception as e:
+            st.error(f"❌ Error searching folders for '{folder_name}': {e}")
+            return None
+        
+        files = results.get('files', [])
+        preferred = set(preferred_parent_ids)
+        for file in files:
+            if file.get('parents') and file['parents'][0] in preferred:
+                return file['id']
+        return files[0]['id'] if files else None
+    
+    @_ttl_cached
     def find_folder_recursively(self, folder_name, search_in_folder_id=None):
         """Find a folder by name recursively searching through all accessible folders"""
         try:
             # First, try direct search (all folders with this name)
-            query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+            query = f"name='{_q_escape(folder_name)}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
             results = self.service.files().list(
                 q=query,
-                fields="files(id, name, parents)",
+                fields="files(id, parents)",
                 pageSize=50
             ).execute()
             
@@ -190,19 +566,21 @@ class GoogleDriveManager:
             st.error(f"❌ Error in recursive folder search for '{folder_name}': {e}")
             return None
     
+    @_ttl_cached
     def find_file_by_name(self, file_name, folder_id=None):
         """Find a file by name, optionally in a specific folder"""
         if not self.service:
             return None
+        
+        if folder_id:
+            cached_id = self._cached_entry_id(file_name, folder_id, 'file')
+            if cached_id:
+                return cached_id
             
         try:
-            query = f"name='{file_name}' and trashed=false"
-            if folder_id:
-                query += f" and '{folder_id}' in parents"
-            
             results = self.service.files().list(
-                q=query,
-                fields="files(id, name)",
+                q=self._name_query(file_name, folder_id),
+                fields="files(id)",
                 pageSize=10
             ).execute()
             
@@ -213,108 +591,87 @@ class GoogleDriveManager:
             st.error(f"❌ Error finding file '{file_name}': {e}")
             return None
     
+    @_ttl_cached
+    def find_files_by_names(self, names, folder_id):
+        """Find several files or folders in one folder with a single query per 100 names
+        
+        names is a tuple (it is part of the lookup-cache key); returns name -> id, None if not found.
+        """
+        found = {name: None for name in names}
+        if not self.service or not names:
+            return found
+            
+        try:
+            names = list(found)
+            for i in range(0, len(names), 100):
+                chunk = names[i:i + 100]
+                name_filter = " or ".join(f"name='{_q_escape(n)}'" for n in chunk)
+                results = self.service.files().list(
+                    q=f"({name_filter}) and '{folder_id}' in parents and trashed=false",
+                    fields="files(id, name)",
+                    pageSize=1000
+                ).execute()
+                
+                for file in results.get('files', []):
+                    # Keep the first match, mirroring find_file_by_name
+                    if found.get(file['name']) is None:
+                        found[file['name']] = file['id']
+            
+            return found
+            
+        except Exception as e:
+            st.error(f"❌ Error finding files in folder: {e}")
+            return found
+    
     def _create_virtual_structure(self, folders):
         """Create a virtual processed folder structure from accessible folders"""
-        structure = {}
+        # Group folders by sensor-type prefix in one pass (obs_site1 -> obs)
+        groups = {'obs': [], 'hobo': [], 'tb': [], 'atm': []}
+        for f in folders:
+            prefix, sep, rest = f['name'].partition('_')
+            if sep and rest.startswith('site') and prefix in groups:
+                groups[prefix].append(f)
         
-        # Group folders by sensor type
-        obs_folders = [f for f in folders if f['name'].startswith('obs_site')]
-        hobo_folders = [f for f in folders if f['name'].startswith('hobo_site')]
-        tb_folders = [f for f in folders if f['name'].startswith('tb_site')]
-        atm_folders = [f for f in folders if f['name'].startswith('atm_site')]
-        
-        if obs_folders:
-            structure['obs'] = {
-                'type': 'folder',
-                'id': 'virtual_obs',
-                'subfolders': {f['name']: {'type': 'folder', 'id': f['id']} for f in obs_folders}
-            }
-        
-        if hobo_folders:
-            structure['hobo'] = {
-                'type': 'folder', 
-                'id': 'virtual_hobo',
-                'subfolders': {f['name']: {'type': 'folder', 'id': f['id']} for f in hobo_folders}
-            }
-        
-        if tb_folders:
-            structure['tb'] = {
-                'type': 'folder',
-                'id': 'virtual_tb', 
-                'subfolders': {f['name']: {'type': 'folder', 'id': f['id']} for f in tb_folders}
-            }
-        
-        if atm_folders:
-            structure['atmos'] = {
-                'type': 'folder',
-                'id': 'virtual_atmos',
-                'subfolders': {f['name']: {'type': 'folder', 'id': f['id']} for f in atm_folders}
-            }
+        structure = {}
+        for prefix, key in (('obs', 'obs'), ('hobo', 'hobo'), ('tb', 'tb'), ('atm', 'atmos')):
+            if groups[prefix]:
+                structure[key] = {
+                    'type': 'folder',
+                    'id': f'virtual_{key}',
+                    'subfolders': {f['name']: {'type': 'folder', 'id': f['id']} for f in groups[prefix]}
+                }
         
         return structure
     
+    @_ttl_cached
     def get_folder_structure(self, folder_id=None):
         """Get the folder structure recursively"""
+        is_root = not folder_id
         if not folder_id:
-            # Check for accessible items without verbose debugging
-            try:
-                # List all accessible folders and files
-                all_items = self.service.files().list(
-                    q="trashed=false",
-                    fields="files(id, name, mimeType, parents)",
-                    pageSize=50
-                ).execute()
-                
-                items = all_items.get('files', [])
-                if items:
-                    folders = [item for item in items if item['mimeType'] == 'application/vnd.google-apps.folder']
-                    files = [item for item in items if item['mimeType'] != 'application/vnd.google-apps.folder']
-                    
-                    if folders:
-                        
-                        # Look for 'processed' specifically
-                        processed_folders = [f for f in folders if 'processed' in f['name'].lower()]
-                        if processed_folders:
-                            folder_id = processed_folders[0]['id']  # Use the first match
-                        else:
-                            st.warning("⚠️ **No 'processed' folder found at root level, searching in nested folders...**")
-                            # Search recursively in each folder for 'processed'
-                            for folder in folders:
-                                nested_processed = self.find_folder_by_name('processed', folder['id'])
-                                if nested_processed:
-                                    folder_id = nested_processed
-                                    break
-                            
-                            if not folder_id:
-                                st.warning("⚠️ **No 'processed' folder found even in nested folders**")
-                                
-                                # SOLUTION: Create virtual structure from accessible folders
-                                # st.info("💡 **Creating virtual 'processed' structure from accessible folders**")
-                                return self._create_virtual_structure(folders)
-                    else:
-                        # st.warning("📂 **No folders accessible to Service Account**")
-                        pass
-                        
-                        if files and not folders:
-                            # st.info(
-                                # "📁 **Accessible files:**\n\n" +
-                                # "\n".join([f"• {file['name']}" for file in files[:10]])
-                            # )
-                            pass
-                else:
-                    # st.error("❌ **No items accessible to Service Account - folder sharing may not have propagated yet**")
-                    pass
-                    
-            except Exception as e:
-                st.error(f"❌ **Debug error:** {e}")
-                
-            # If we still don't have folder_id, try the original method and then recursive search
+            folder_id = self._processed_root_id
+        if not folder_id:
+            folder_id = self.find_folder_by_name('processed') or self.find_folder_recursively('processed')
+            
             if not folder_id:
-                folder_id = self.find_folder_by_name('processed')
+                # Last resort: list the shared folders once and either find a
+                # nested 'processed' among them or build a virtual structure
+                try:
+                    folders = self.service.files().list(
+                        q="mimeType='application/vnd.google-apps.folder' and trashed=false",
+                        fields="files(id, name)",
+                        pageSize=50
+                    ).execute().get('files', [])
+                except Exception as e:
+                    st.error(f"❌ Error listing accessible folders: {e}")
+                    folders = []
                 
-            # If still not found, try recursive search
-            if not folder_id:
-                folder_id = self.find_folder_recursively('processed')
+                if folders:
+                    st.warning("⚠️ **No 'processed' folder found at root level, searching in nested folders...**")
+                    folder_id = self._find_nested_folder('processed', [f['id'] for f in folders])
+                    
+                    if not folder_id:
+                        st.warning("⚠️ **No 'processed' folder found even in nested folders**")
+                        return self._create_virtual_structure(folders)
                 
             if not folder_id:
                 st.error(
@@ -328,26 +685,98 @@ class GoogleDriveManager:
                 )
                 return {}
         
+        cached = self._cached_structure(folder_id)
+        if cached is not None:
+            return cached
+        
+        if is_root:
+            # Fetch the whole tree level by level so the site/file drill-downs
+            # that follow are answered from _structure_cache
+            try:
+                self._prefetch_folder_tree(folder_id)
+                return self._structure_cache[folder_id][1]
+            except HttpError as e:
+                st.error(f"❌ Error accessing Google Drive folder: {e}")
+        
         structure = {}
         files = self.list_files_in_folder(folder_id)
         
         for file in files:
-            if file['mimeType'] == 'application/vnd.google-apps.folder':
-                # It's a folder
-                structure[file['name']] = {
-                    'type': 'folder',
-                    'id': file['id']
-                }
-            else:
-                # It's a file
-                structure[file['name']] = {
-                    'type': 'file',
-                    'id': file['id'],
-                    'mimeType': file['mimeType']
-                }
+            structure[file['name']] = self._structure_entry(file)
         
+        self._structure_cache[folder_id] = (time.monotonic(), structure)
         return structure
     
+    def _structure_entry(self, file):
+        """Describe a Drive item the way get_folder_structure reports it"""
+        if file['mimeType'] == 'application/vnd.google-apps.folder':
+            # It's a folder
+            return {
+                'type': 'folder',
+                'id': file['id']
+            }
+        # It's a file
+        return {
+            'type': 'file',
+            'id': file['id'],
+            'mimeType': file['mimeType'],
+            'modifiedTime': file.get('modifiedTime')
+        }
+    
+    def _list_children_bulk(self, folder_ids):
+        """List the children of many folders with one paginated query per 50 parents"""
+        chunks = [folder_ids[i:i + 50] for i in range(0, len(folder_ids), 50)]
+        if len(chunks) <= 1:
+            return self._list_children_chunk(self.service, folder_ids)
+        
+        # Several queries are needed: run them concurrently, each on its own thread's client
+        children = []
+        with ThreadPoolExecutor(max_workers=min(len(chunks), 10)) as executor:
+            for files in executor.map(self._list_children_chunk_in_thread, chunks):
+                children.extend(files)
+        return children
+    
+    def _list_children_chunk_in_thread(self, folder_ids):
+        """Worker body for _list_children_bulk"""
+        return self._list_children_chunk(self._thread_service(), folder_ids)
+    
+    def _list_children_chunk(self, service, folder_ids):
+        """List the children of up to 50 folders, following nextPageToken"""
+        parents = " or ".join(f"'{fid}' in parents" for fid in folder_ids)
+        children = []
+        page_token = None
+        while True:
+            results = service.files().list(
+                q=f"({parents}) and trashed=false",
+                fields="nextPageToken, files(id, name, mimeType, parents, modifiedTime)",
+                pageSize=1000,
+                pageToken=page_token
+            ).execute()
+            children.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        return children
+    
+    def _prefetch_folder_tree(self, root_id):
+        """Populate _structure_cache for root_id and every folder below it, one query per tree level"""
+        level = [root_id]
+        while level:
+            structures = {fid: {} for fid in level}
+            next_level = []
+            for item in self._list_children_bulk(level):
+                # Rebuild the tree client-side from the parents field
+                parent = next((p for p in item.get('parents', []) if p in structures), None)
+                if parent is None:
+                    continue
+                entry = self._structure_entry(item)
+                structures[parent][item['name']] = entry
+                if entry['type'] == 'folder':
+                    next_level.append(item['id'])
+            now = time.monotonic()
+            self._structure_cache.update((fid, (now, structure)) for fid, structure in structures.items())
+            level = next_level
+    
     def test_drive_access(self):
         """Simple test to verify Google Drive API access"""
         if not self.service:
@@ -362,7 +791,17 @@ class GoogleDriveManager:
             return False, f"Failed - {str(e)}"
     
     def load_logo_from_drive(self, folder_id, logo_filename="logo_1.png"):
-        """Load logo from Google Drive folder with GitHub fallback"""
+        """Load logo from Google Drive folder with GitHub fallback (cached once loaded)"""
+        cache_key = (folder_id, logo_filename)
+        if cache_key not in self._logo_cache:
+            logo_base64 = self._fetch_logo(folder_id, logo_filename)
+            if not logo_base64:
+                return logo_base64
+            self._logo_cache[cache_key] = logo_base64
+        return self._logo_cache[cache_key]
+    
+    def _fetch_logo(self, folder_id, logo_filename):
+        """Download the logo as base64, from Google Drive or the GitHub fallback"""
         if not self.service:
             return self._load_logo_from_github(logo_filename)
             
@@ -379,8 +818,7 @@ class GoogleDriveManager:
                 st.info(f"ℹ️ Could not download '{logo_filename}' from Google Drive, using GitHub fallback")
                 return self._load_logo_from_github(logo_filename)
             
-            # Convert to base64
-            import base64
+            # Convert to base64 (image_bytes is the response body itself, no extra copy)
             return base64.b64encode(image_bytes).decode()
             
         except Exception as e:
@@ -390,18 +828,15 @@ class GoogleDriveManager:
     def _load_logo_from_github(self, logo_filename="logo_1.png"):
         """Load logo from GitHub repository as fallback"""
         try:
-            import base64
-            import requests
-            
             # GitHub raw URL for the logo file
             github_url = f"https://raw.githubusercontent.com/Raaja08/hydro_link/main/assets/{logo_filename}"
             
-            response = requests.get(github_url)
-            if response.status_code == 200:
-                return base64.b64encode(response.content).decode()
-            else:
-                st.warning(f"⚠️ Could not load logo from GitHub: {response.status_code}")
-                return ""
+            with _SESSION.get(github_url, stream=True, timeout=5) as response:
+                if response.status_code == 200:
+                    return _b64encode_chunks(response.iter_content(chunk_size=64 * 1024))
+                else:
+                    st.warning(f"⚠️ Could not load logo from GitHub: {response.status_code}")
+                    return ""
                 
         except Exception as e:
             st.warning(f"⚠️ Error loading logo from GitHub: {e}")
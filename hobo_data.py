@@ -0,0 +1,41 @@
+"""
+HOBO helpers shared by the HOBO pages (local and Google Drive versions) and
+scripts/build_hobo_parquet.py, so the dashboards and the ingest-time Parquet
+copies always hold the same frame and thin it the same way
+"""
+import numpy as np
+import pandas as pd
+
+# Pixel columns M4 keeps the first, last, min and max of
+M4_PIXELS = 1500
+
+def downcast(df):
+    """float32 readings and second-resolution timestamps halve the bytes every view pass touches"""
+    df = df.astype({col: 'float32' for col in df.select_dtypes('float64').columns})
+    df.index = df.index.astype('datetime64[s]')
+    return df
+
+def read_hobo_csv(file_path):
+    """Parse a processed HOBO CSV into a sorted, timestamp-indexed, downcast frame"""
+    # Arrow's multithreaded parser already types ISO timestamps; to_datetime then only
+    # has to coerce files written in other formats (e.g. hobo_site2's 1/1/23 0:00)
+    df = pd.read_csv(file_path, engine='pyarrow')
+    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    df.dropna(subset=['timestamp'], inplace=True)
+    df.set_index('timestamp', inplace=True)
+    df.sort_index(inplace=True)
+    return downcast(df)
+
+def m4_indices(index, values, n_pixels=M4_PIXELS):
+    """Row positions kept by M4: first, last, min and max of each pixel column"""
+    ts = index.asi8
+    span = max(ts[-1] - ts[0], 1)
+    bins = np.minimum(((ts - ts[0]) * (n_pixels / span)).astype(np.int64), n_pixels - 1)
+    
+    # The index is sorted, so each pixel column is a contiguous run of rows
+    first = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    last = np.r_[first[1:] - 1, len(ts) - 1]
+    # Sorting by (column, value) puts each column's min at its first row and max at its last
+    by_min = np.lexsort((np.where(np.isnan(values), np.inf, values), bins))
+    by_max = np.lexsort((np.where(np.isnan(values), -np.inf, values), bins))
+    return np.unique(np.concatenate([first, last, by_min[first], by_max[last]]))
@@ -2,12 +2,21 @@
 # ALL ORIGINAL SOPHISTICATED FEATURES: exact plotting, statistics, missing data handling
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+import json
 import os
 from datetime import datetime, timedelta
 import base64
 import calendar
+import html
+
+# orjson (a requirement) serializes figure JSON (and numpy arrays) much faster than stdlib json
+pio.json.config.default_engine = "orjson"
 
 # ---------------------------
 # CONFIGURATION
@@ -19,45 +28,296 @@ TB_BASE_PATH = "processed/tb"
 SENSOR_METADATA_PATH = "processed/sensor_metadata/sensor_metadata.csv"
 LOGO_PATH = "assets/logo_1.png"
 
+# Column types for Arrow's CSV reader; parsing happens in one typed C++ pass.
+# Readings are float32: mm/°C values shown to 2 decimals don't need float64, and
+# every resample/sum/cumsum pass then moves half the bytes
+TB_COLUMN_TYPES = {
+    'timestamp': pa.timestamp('s'),
+    'rainfall_mm': pa.float32(),
+    'temperature_c': pa.float32(),
+}
+
+# Resample in separate pieces across gaps longer than this; months, the widest bins, are at most 31 days
+RESAMPLE_GAP_SPLIT = np.timedelta64(32, 'D')
+
 # ---------------------------
 # UTILITY FUNCTIONS
 # ---------------------------
+def _read_parquet_copy(file_path):
+    """Return the parsed frame saved next to the CSV, or None if missing or stale"""
+    pq_path = file_path + '.parquet'
+    try:
+        if os.path.getmtime(pq_path) >= os.path.getmtime(file_path):
+            return pd.read_parquet(pq_path)
+    except (OSError, ImportError, ValueError):
+        pass
+    return None
+
+def _write_parquet_copy(df, file_path):
+    """Save the parsed frame as Parquet so the next cold start skips CSV parsing"""
+    pq_path = file_path + '.parquet'
+    tmp_path = pq_path + '.tmp'
+    try:
+        df.to_parquet(tmp_path, compression='zstd')
+        os.replace(tmp_path, pq_path)
+    except (OSError, ImportError, ValueError):
+        # Read-only checkout or no pyarrow: keep serving from the CSV
+        pass
+
 @st.cache_data
 def load_csv(file_path):
-    """Load CSV with proper data type handling"""
-    df = pd.read_csv(file_path)
-    # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format
-    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    """Load CSV with proper data type handling, via an up-to-date Parquet copy when present"""
+    df = _read_parquet_copy(file_path)
+    if df is not None:
+        return df
+    
+    try:
+        # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format, so Arrow can
+        # type timestamps and readings while it parses; empty cells come back as NaN
+        df = pa_csv.read_csv(file_path, convert_options=pa_csv.ConvertOptions(column_types=TB_COLUMN_TYPES)).to_pandas()
+    except pa.ArrowInvalid:
+        # Some row is in another layout: parse untyped and coerce bad values to NaN/NaT
+        df = pd.read_csv(file_path, engine='pyarrow')
+        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+        df['rainfall_mm'] = pd.to_numeric(df['rainfall_mm'], errors='coerce').astype('float32')
+        if 'temperature_c' in df.columns:
+            df['temperature_c'] = pd.to_numeric(df['temperature_c'], errors='coerce').astype('float32')
+    
     df.dropna(subset=['timestamp'], inplace=True)
     df.set_index('timestamp', inplace=True)
     df.sort_index(inplace=True)
     
-    # Convert empty strings in rainfall_mm to NaN
-    df['rainfall_mm'] = pd.to_numeric(df['rainfall_mm'], errors='coerce')
-    
-    # Convert temperature_c to numeric if it exists
-    if 'temperature_c' in df.columns:
-        df['temperature_c'] = pd.to_numeric(df['temperature_c'], errors='coerce')
-    
+    _write_parquet_copy(df, file_path)
     return df
 
-@st.cache_data
-def encode_img_to_base64(image_path):
-    """Encode image to base64 for display"""
+@st.cache_resource
+def header_html(image_path):
+    """Build the page header markup once per process; text-only if the logo is missing"""
     try:
         with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
+            logo_base64 = base64.b64encode(f.read()).decode()
     except FileNotFoundError:
-        return ""
+        return """
+        <div style='padding: 20px 10px 10px 10px;'>
+            <h1 style='margin-bottom: 0;'>🌊 S4W Sensor Dashboard</h1>
+            <p style='margin-top: 5px; color: gray;font-size: 18px; font-weight: 500;'>From small sensors to big insights — monitor what matters ❤️</p>
+        </div>
+    """
+    return f"""
+        <div style='display: flex; justify-content: space-between; align-items: center; padding: 20px 10px 10px 10px;'>
+            <div>
+                <h1 style='margin-bottom: 0;'>🌊 S4W Sensor Dashboard</h1>
+                <p style='margin-top: 5px; color: gray;font-size: 18px; font-weight: 500;'>From small sensors to big insights — monitor what matters ❤️</p>
+            </div>
+            <div>
+                <img src='data:image/png;base64,{logo_base64}' style='height:100px;'/>
+            </div>
+        </div>
+    """
+
+@st.cache_data(max_entries=32)
+def fig_html_bytes(fig_json):
+    """Standalone HTML for a figure, rendered once per distinct figure JSON"""
+    # The JSON came from a validated figure, so skip re-validating it
+    return pio.to_html(json.loads(fig_json), include_plotlyjs='cdn', validate=False).encode()
+
+@st.cache_data(ttl=60)
+def list_sites(base_path):
+    """List site folders; scandir's d_type avoids a stat() per entry"""
+    return [e.name for e in os.scandir(base_path) if e.is_dir(follow_symlinks=False) and not e.name.startswith('.')]
+
+@st.cache_data(ttl=60)
+def list_csvs(site_path):
+    """List CSV files in a site folder"""
+    return [e.name for e in os.scandir(site_path) if e.name.endswith('.csv') and not e.name.startswith('.')]
+
+def resample_column(series, rule, how):
+    """Bin a series with pandas' built-in sum/mean; empty bins come out NaN so gaps still show"""
+    # Split at gaps longer than any bin (e.g. a stray epoch-0 timestamp) so no bins are
+    # allocated across them; callers reindex onto their own range, restoring those as NaN
+    breaks = np.flatnonzero(np.diff(series.index.values) > RESAMPLE_GAP_SPLIT)
+    if len(breaks):
+        bounds = np.r_[0, breaks + 1, len(series)]
+        return pd.concat([resample_column(series.iloc[a:b], rule, how) for a, b in zip(bounds[:-1], bounds[1:])])
+    resampled = series.resample(rule)
+    # min_count=1 keeps an all-missing rainfall bin NaN instead of 0
+    binned = resampled.sum(min_count=1) if how == "sum" else resampled.mean()
+    return binned.to_frame()
+
+@st.cache_data
+def prebin(file_path, column, rule, how):
+    """Resample one column of the whole file once; views slice the cached bins"""
+    return resample_column(load_csv(file_path)[column], rule, how)
+
+@st.cache_data
+def time_bins(file_path, period):
+    """Start of every calendar period ('M' or 'Y') that holds at least one reading"""
+    # Unique period codes of the sorted index are already ordered and non-empty
+    return load_csv(file_path).index.to_period(period).unique().to_timestamp()
+
+@st.cache_data(max_entries=32)
+def build_figure(plot_df, data_column, data_type, view_mode, time_title):
+    """Build the TB plot; plot_df is the small binned frame, so hashing it is cheap and
+    reruns that don't change the selection reuse the cached figure"""
+    # ORIGINAL FEATURE: For rainfall, create cumulative; for temperature, don't
+    if data_type == "Rainfall":
+        # Calculate cumulative rainfall on a float32 buffer; NaN bins stay NaN so gaps remain visible
+        rainfall = plot_df[data_column].to_numpy(np.float32)
+        # A dry or fully missing period has nothing to accumulate: skip the second trace and axis
+        show_cumulative = np.nanmax(rainfall, initial=0) > 0
+        if show_cumulative:
+            cumulative_rainfall = np.nancumsum(rainfall)
+            cumulative_rainfall[np.isnan(rainfall)] = np.nan
+    else:
+        show_cumulative = False
+    
+    # ORIGINAL SOPHISTICATED PLOTTING: Create the appropriate plot type
+    if data_type == "Rainfall":
+        # ORIGINAL: Bar chart for rainfall - gaps will show as missing bars
+        fig = px.bar(
+            plot_df, y=data_column,
+            title=time_title,
+            labels={data_column: f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})", "index": "Time"},
+            template="plotly_white",
+            color_discrete_sequence=["#1f77b4"]  # Original specific blue color
+        )
+    else:
+        # ORIGINAL: Line chart for temperature - gaps will show as disconnected lines
+        fig = px.line(
+            plot_df, y=data_column,
+            title=time_title,
+            labels={data_column: f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})", "index": "Time"},
+            template="plotly_white",
+            color_discrete_sequence=["#1f77b4"],  # Same blue as rainfall
+            render_mode="webgl"
+        )
+        # Add markers to the line and ensure gaps are not connected
+        fig.update_traces(mode='lines+markers', connectgaps=False)
+    
+    # ORIGINAL: Calculate y-axis max (higher than highest value)
+    max_data = plot_df[data_column].max()
+    
+    if pd.isna(max_data):
+        max_data = 1
+        
+    # ORIGINAL: For temperature, calculate proper y-axis range
+    if data_type == "Temperature":
+        min_data = plot_df[data_column].min()
+        if not pd.isna(min_data):
+            # If all temperatures are positive, start from 0
+            if min_data >= 0:
+                y_min = 0
+                y_max = max_data * 1.2  # 20% padding above max
+            else:
+                # If there are negative temperatures, add padding below min
+                y_min = min_data * 1.2  # 20% padding below min (makes it more negative)
+                y_max = max_data * 1.2  # 20% padding above max
+        else:
+            y_min = 0
+            y_max = 1
+    else:
+        # For rainfall, keep existing logic
+        if max_data == 0:
+            max_data = 1
+        y_min = 0
+        y_max = max_data * 1.2  # 20% padding above max value
+    
+    # ORIGINAL: Add cumulative rainfall line only for rainfall data
+    if show_cumulative:
+        y2_max = np.nanmax(cumulative_rainfall) * 1.2
+        
+        fig.add_trace(go.Scattergl(
+            x=plot_df.index.values, 
+            y=cumulative_rainfall, 
+            mode="lines+markers",
+            name="Cumulative Rainfall", 
+            line=dict(color="#00509E"),  # Original dark blue color
+            yaxis="y2",
+            connectgaps=False  # This ensures gaps are visible in the cumulative line
+        ))
+    
+    # ORIGINAL: Update layout - dual y-axis for rainfall, single for temperature
+    if show_cumulative:
+        # ORIGINAL: Dual y-axis layout for rainfall
+        fig.update_layout(
+            yaxis=dict(
+                title=f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})",
+                side="left",
+                showgrid=True,
+                gridwidth=1,
+                gridcolor='lightgray',
+                range=[y_min, y_max]
+            ),
+            yaxis2=dict(
+                title="Cumulative Rainfall (mm)",
+                side="right",
+                overlaying="y",
+                showgrid=False,
+                range=[0, y2_max]
+            ),
+            xaxis_title="Date" if view_mode in ["Monthly", "Yearly"] else "Time",
+            height=400,
+            hovermode='x unified',
+            legend=dict(
+                x=1.08,  # Move legend further right to avoid secondary y-axis
+                y=0.5,   # Center vertically
+                xanchor='left',
+                yanchor='middle'
+            )
+        )
+    else:
+        # ORIGINAL: Single y-axis layout for temperature
+        fig.update_layout(
+            yaxis=dict(
+                title=f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})",
+                showgrid=True,
+                gridwidth=1,
+                gridcolor='lightgray',
+                range=[y_min, y_max]
+            ),
+            xaxis_title="Date" if view_mode in ["Monthly", "Yearly"] else "Time",
+            height=400,
+            hovermode='x unified'
+        )
+    
+    # ORIGINAL: Special x-axis formatting for different view modes
+    if view_mode == "Monthly":
+        # Show all dates from first to last day of month
+        fig.update_xaxes(
+            dtick="D1",  # Show every day
+            tickformat="%d",  # Show day numbers
+            tickmode="linear",
+            range=[plot_df.index.min(), plot_df.index.max()]  # Limit to actual month range
+        )
+    elif view_mode == "Yearly":
+        # Show all months
+        fig.update_xaxes(
+            dtick="M1",  # Show every month
+            tickformat="%b",  # Show month abbreviations
+            tickmode="linear",
+            range=[plot_df.index.min(), plot_df.index.max()]  # Limit to actual year range
+        )
+    
+    return fig
 
-def get_summary_stats(df, view_mode, plot_df, agg_type=None):
+def _longest_run_of_zeros(values):
+    """Length of the longest run of zeros, from the gaps between non-zero positions"""
+    nonzero = np.flatnonzero(values != 0)
+    return int((np.diff(np.r_[-1, nonzero, len(values)]) - 1).max())
+
+@st.cache_data(max_entries=64)
+def get_summary_stats(_df, view_mode, plot_df, agg_type=None, has_missing=None):
     """
     Calculate comprehensive summary statistics for the given data.
     Returns None if there's missing data, otherwise returns stats dict.
     ORIGINAL SOPHISTICATED APPROACH - Only calculate stats when data is complete.
+    Pass has_missing when the caller has already scanned plot_df for NaN.
+    Cached on the small binned plot_df; the unused raw slice (_df) is not hashed.
     """
     # Check if there are any missing values in the plot data
-    if plot_df['rainfall_mm'].isna().any():
+    if has_missing is None:
+        has_missing = plot_df['rainfall_mm'].isna().any()
+    if has_missing:
         return None
     
     stats = {}
@@ -74,53 +334,39 @@ def get_summary_stats(df, view_mode, plot_df, agg_type=None):
         
     elif view_mode == "Monthly":
         # Monthly: Total, Max daily, Wet-dry days, Dry spell, Average
-        stats["Total rainfall (mm)"] = round(plot_df['rainfall_mm'].sum(), 2)
-        stats["Max daily rainfall (mm)"] = round(plot_df['rainfall_mm'].max(), 2)
-        stats["Wet days"] = (plot_df['rainfall_mm'] > 0).sum()
-        stats["Dry days"] = (plot_df['rainfall_mm'] == 0).sum()
+        # Every statistic reads the same raw array; the wet mask is built once and reused
+        daily = plot_df['rainfall_mm'].to_numpy()
+        wet = daily > 0
+        stats["Total rainfall (mm)"] = round(np.nansum(daily), 2)
+        stats["Max daily rainfall (mm)"] = round(np.nanmax(daily), 2)
+        stats["Wet days"] = wet.sum()
+        stats["Dry days"] = (daily == 0).sum()
         
         # Calculate longest dry spell (consecutive days with no rain)
-        rainfall_series = plot_df['rainfall_mm'].fillna(0)
-        max_dry_spell = 0
-        current_dry = 0
-        for val in rainfall_series:
-            if val == 0:
-                current_dry += 1
-                max_dry_spell = max(max_dry_spell, current_dry)
-            else:
-                current_dry = 0
-        stats["Longest dry spell (days)"] = max_dry_spell
+        stats["Longest dry spell (days)"] = _longest_run_of_zeros(np.nan_to_num(daily))
         
         # Average from non-zero values only
-        non_zero_vals = plot_df['rainfall_mm'][plot_df['rainfall_mm'] > 0]
-        avg_rainfall = non_zero_vals.mean() if len(non_zero_vals) > 0 else 0
-        stats["Average daily rainfall (mm)"] = round(avg_rainfall, 2) if avg_rainfall > 0 else 0
+        stats["Average daily rainfall (mm)"] = round(daily[wet].mean(), 2) if wet.any() else 0
         
     elif view_mode == "Yearly":
         # Yearly: Annual total, Wettest month, Dry months, Wet-dry days, Longest dry spell
-        stats["Annual total (mm)"] = round(plot_df['rainfall_mm'].sum(), 2)
+        monthly = plot_df['rainfall_mm'].to_numpy()
+        stats["Annual total (mm)"] = round(np.nansum(monthly), 2)
         
         # Wettest month
-        if plot_df['rainfall_mm'].max() > 0:
-            wettest = plot_df['rainfall_mm'].idxmax()
-            stats["Wettest month"] = f"{wettest.strftime('%B')} ({round(plot_df['rainfall_mm'].max(), 2)} mm)"
+        if np.nanmax(monthly, initial=0) > 0:
+            # One pass over the raw array gives both the position and the value
+            wettest = int(np.nanargmax(monthly))
+            stats["Wettest month"] = f"{calendar.month_name[plot_df.index[wettest].month]} ({round(float(monthly[wettest]), 2)} mm)"
         else:
             stats["Wettest month"] = "N/A"
             
-        stats["Dry months"] = (plot_df['rainfall_mm'] == 0).sum() + plot_df['rainfall_mm'].isna().sum()
-        stats["Wet months"] = (plot_df['rainfall_mm'] > 0).sum()
+        stats["Dry months"] = (monthly == 0).sum() + np.isnan(monthly).sum()
+        stats["Wet months"] = (monthly > 0).sum()
         
         # Longest dry spell in days (convert from monthly data)
         # For yearly view, we need to estimate days from months
-        rainfall_series = plot_df['rainfall_mm'].fillna(0)
-        max_dry_spell_months = 0
-        current_dry = 0
-        for val in rainfall_series:
-            if val == 0:
-                current_dry += 1
-                max_dry_spell_months = max(max_dry_spell_months, current_dry)
-            else:
-                current_dry = 0
+        max_dry_spell_months = _longest_run_of_zeros(np.nan_to_num(monthly))
         # Convert months to approximate days (30 days per month)
         stats["Longest dry spell (days)"] = max_dry_spell_months * 30
         
@@ -132,36 +378,24 @@ def get_summary_stats(df, view_mode, plot_df, agg_type=None):
     
     return stats
 
+def stats_table_html(stats):
+    """Render the summary stats as a plain two-column HTML table (no Arrow round trip for a few rows)"""
+    rows = "".join(
+        f"<tr><td>{html.escape(str(name))}</td><td style='text-align: right;'>{html.escape(str(value))}</td></tr>"
+        for name, value in stats.items()
+    )
+    return f"<table style='width: 100%;'><tr><th></th><th style='text-align: right;'>Value</th></tr>{rows}</table>"
+
 # ---------------------------
 # LOGO HEADER
 # ---------------------------
-logo_base64 = encode_img_to_base64(LOGO_PATH)
-
-if logo_base64:
-    st.markdown(f"""
-        <div style='display: flex; justify-content: space-between; align-items: center; padding: 20px 10px 10px 10px;'>
-            <div>
-                <h1 style='margin-bottom: 0;'>🌊 S4W Sensor Dashboard</h1>
-                <p style='margin-top: 5px; color: gray;font-size: 18px; font-weight: 500;'>From small sensors to big insights — monitor what matters ❤️</p>
-            </div>
-            <div>
-                <img src='data:image/png;base64,{logo_base64}' style='height:100px;'/>
-            </div>
-        </div>
-    """, unsafe_allow_html=True)
-else:
-    st.markdown("""
-        <div style='padding: 20px 10px 10px 10px;'>
-            <h1 style='margin-bottom: 0;'>🌊 S4W Sensor Dashboard</h1>
-            <p style='margin-top: 5px; color: gray;font-size: 18px; font-weight: 500;'>From small sensors to big insights — monitor what matters ❤️</p>
-        </div>
-    """, unsafe_allow_html=True)
+st.markdown(header_html(LOGO_PATH), unsafe_allow_html=True)
 
 # ---------------------------
 # FILE SELECTION (GitHub storage)
 # ---------------------------
 try:
-    sites = [d for d in os.listdir(TB_BASE_PATH) if os.path.isdir(os.path.join(TB_BASE_PATH, d)) and not d.startswith('.')]
+    sites = list_sites(TB_BASE_PATH)
     
     if not sites:
         st.error("No TB sensor folders found. Please check the folder structure.")
@@ -171,7 +405,7 @@ try:
     
     # Get CSV files in selected site
     site_path = os.path.join(TB_BASE_PATH, selected_site)
-    csv_files = [f for f in os.listdir(site_path) if f.endswith('.csv') and not f.startswith('.')]
+    csv_files = list_csvs(site_path)
     
     if not csv_files:
         st.error(f"No CSV files found in {selected_site}")
@@ -207,42 +441,33 @@ if selected_file:
     # Set column name and aggregation function based on data type
     if data_type == "Rainfall":
         data_column = 'rainfall_mm'
-        agg_func = lambda x: x.sum() if (len(x) > 0 and x.notna().any()) else None
+        agg_how = "sum"
     else:  # Temperature
         data_column = 'temperature_c'
-        agg_func = lambda x: x.mean() if (len(x) > 0 and x.notna().any()) else None
+        agg_how = "mean"
 
     if view_mode == "Custom":
         start = st.sidebar.date_input("Start Date", min_value=min_date.date(), value=min_date.date())
         end = st.sidebar.date_input("End Date", min_value=min_date.date(), value=max_date.date())
-        mask = (df.index.date >= start) & (df.index.date <= end)
-        filtered_df = df[mask]
+        # The index is sorted, so .loc slices by binary search; the end day is inclusive
+        filtered_df = df.loc[pd.Timestamp(start):pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')]
         
         # ORIGINAL FEATURE: Determine aggregation based on date range
         date_diff = (end - start).days
         if date_diff <= 7:
             # Create continuous hourly index and reindex with NaN for missing periods
-            full_range = pd.date_range(start=pd.Timestamp(start), end=pd.Timestamp(end) + pd.Timedelta(days=1), freq='H', inclusive='left')
-            hourly_data = filtered_df.resample('H').agg({
-                data_column: agg_func
-            })
-            plot_df = hourly_data.reindex(full_range)
+            full_range = pd.date_range(start=pd.Timestamp(start), end=pd.Timestamp(end) + pd.Timedelta(days=1), freq='h', inclusive='left')
+            plot_df = prebin(file_path, data_column, 'h', agg_how).reindex(full_range)
             freq_text = "Hourly"
         elif date_diff <= 90:
             # Create continuous daily index
             full_range = pd.date_range(start=start, end=end, freq='D')
-            daily_data = filtered_df.resample('D').agg({
-                data_column: agg_func
-            })
-            plot_df = daily_data.reindex(full_range)
+            plot_df = prebin(file_path, data_column, 'D', agg_how).reindex(full_range)
             freq_text = "Daily"
         else:
-            # Create continuous monthly index
+            # Create continuous monthly index; the first month is partial, so bin the selection itself
             full_range = pd.date_range(start=pd.Timestamp(start).replace(day=1), end=pd.Timestamp(end), freq='MS')
-            monthly_data = filtered_df.resample('MS').agg({
-                data_column: agg_func
-            })
-            plot_df = monthly_data.reindex(full_range)
+            plot_df = resample_column(filtered_df[data_column], 'MS', agg_how).reindex(full_range)
             freq_text = "Monthly"
         
         time_title = f"{start.strftime('%b %d, %Y')} to {end.strftime('%b %d, %Y')} ({freq_text})"
@@ -263,34 +488,29 @@ if selected_file:
 
         elif view_mode == "Monthly":
             # ORIGINAL FEATURE: Show all months that have timestamps
-            monthly_groups = df.groupby(pd.Grouper(freq='MS')).size()
-            bins = monthly_groups[monthly_groups > 0].index
-            bin_options = [f"{bin.strftime('%Y %B')}" for bin in bins]
-            selected_bin_str = st.sidebar.selectbox("📆 Select month:", bin_options)
-            selected_bin = bins[bin_options.index(selected_bin_str)]
+            bins = time_bins(file_path, 'M')
+            bin_options = {bin.strftime('%Y %B'): bin for bin in bins}
+            selected_bin = bin_options[st.sidebar.selectbox("📆 Select month:", list(bin_options))]
             delta = pd.DateOffset(months=1)
             
         else:  # Yearly - ORIGINAL UNIQUE TB FEATURE
-            yearly_groups = df.groupby(pd.Grouper(freq='YS')).size()
-            bins = yearly_groups[yearly_groups > 0].index
-            year_options = [bin.strftime('%Y') for bin in bins]
-            selected_year_str = st.sidebar.selectbox("📆 Select year:", year_options)
-            selected_bin = bins[year_options.index(selected_year_str)]
+            # Plain int years keep the widget's options cheap to hash on every rerun
+            years = time_bins(file_path, 'Y').year.tolist()
+            selected_year = st.sidebar.selectbox("📆 Select year:", years)
+            selected_bin = pd.Timestamp(year=selected_year, month=1, day=1)
             delta = pd.DateOffset(years=1)
 
         selected_end = selected_bin + delta
-        filtered_df = df[(df.index >= selected_bin) & (df.index < selected_end)]
+        filtered_df = df.loc[selected_bin:selected_end - pd.Timedelta(1, 'ns')]
 
         if view_mode == "Daily":
             # ORIGINAL FEATURE: Create continuous hourly index for the selected day with aggregation choice
             agg = st.sidebar.radio("Aggregation:", ["15-min", "Hourly"])
-            freq = "15min" if agg == "15-min" else "H"
+            freq = "15min" if agg == "15-min" else "h"
             
-            full_range = pd.date_range(start=selected_bin, end=selected_bin + pd.Timedelta(days=1), freq=freq, inclusive='left')
-            hourly_data = filtered_df.resample(freq).agg({
-                data_column: agg_func
-            })
-            plot_df = hourly_data.reindex(full_range)
+            # A fixed count of slots, so no end Timestamp has to be built
+            full_range = pd.date_range(start=selected_bin, periods=96 if agg == "15-min" else 24, freq=freq)
+            plot_df = prebin(file_path, data_column, freq, agg_how).reindex(full_range)
             
             # Create title
             interval_text = "15 min interval" if agg == "15-min" else "one hour interval"
@@ -298,22 +518,14 @@ if selected_file:
             time_title = f"{data_type} {unit} (Daily: {selected_bin.strftime('%B %d, %Y')} - {interval_text})"
         elif view_mode == "Monthly":
             # ORIGINAL FEATURE: Create continuous daily index for the selected month
-            month_end = selected_bin + pd.offsets.MonthEnd(1)
-            full_range = pd.date_range(start=selected_bin, end=month_end, freq='D')
-            daily_data = filtered_df.resample('D').agg({
-                data_column: agg_func
-            })
-            plot_df = daily_data.reindex(full_range)
+            full_range = pd.date_range(start=selected_bin, periods=selected_bin.days_in_month, freq='D')
+            plot_df = prebin(file_path, data_column, 'D', agg_how).reindex(full_range)
             unit = "(mm)" if data_type == "Rainfall" else "(°C)"
             time_title = f"{data_type} {unit} (Monthly: {selected_bin.strftime('%B %Y')})"
         else:  # Yearly
             # ORIGINAL FEATURE: Create continuous monthly index for the selected year
-            year_end = selected_bin.replace(month=12, day=31)
-            full_range = pd.date_range(start=selected_bin, end=year_end, freq='MS')
-            monthly_data = filtered_df.resample('MS').agg({
-                data_column: agg_func
-            })
-            plot_df = monthly_data.reindex(full_range)
+            full_range = pd.date_range(start=selected_bin, periods=12, freq='MS')
+            plot_df = prebin(file_path, data_column, 'MS', agg_how).reindex(full_range)
             unit = "(mm)" if data_type == "Rainfall" else "(°C)"
             time_title = f"{data_type} {unit} (Yearly: {selected_bin.strftime('%Y')})"
 
@@ -326,151 +538,16 @@ if selected_file:
         st.warning("No data available for the selected time period.")
     else:
         # ORIGINAL FEATURE: Check for missing data and show warning if found
-        has_missing_data = plot_df.isna().any().any()
+        has_missing_data = bool(plot_df[data_column].isna().any())
         if has_missing_data:
             if data_type == "Rainfall":
                 st.warning("⚠️ Some data points are missing for this period. Gaps will be visible in the plot.")
             else:
                 st.warning("⚠️ Some data points are missing for this period. Gaps will be visible in the plot.")
 
-        # ORIGINAL FEATURE: For rainfall, create cumulative; for temperature, don't
-        if data_type == "Rainfall":
-            # Calculate cumulative rainfall - cumsum() naturally handles NaN values
-            plot_df['cumulative_rainfall'] = plot_df[data_column].cumsum()
-            show_cumulative = True
-        else:
-            show_cumulative = False
-        
-        # ORIGINAL SOPHISTICATED PLOTTING: Create the appropriate plot type
-        if data_type == "Rainfall":
-            # ORIGINAL: Bar chart for rainfall - gaps will show as missing bars
-            fig = px.bar(
-                plot_df, y=data_column,
-                title=time_title,
-                labels={data_column: f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})", "index": "Time"},
-                template="plotly_white",
-                color_discrete_sequence=["#1f77b4"]  # Original specific blue color
-            )
-        else:
-            # ORIGINAL: Line chart for temperature - gaps will show as disconnected lines
-            fig = px.line(
-                plot_df, y=data_column,
-                title=time_title,
-                labels={data_column: f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})", "index": "Time"},
-                template="plotly_white",
-                color_discrete_sequence=["#1f77b4"]  # Same blue as rainfall
-            )
-            # Add markers to the line and ensure gaps are not connected
-            fig.update_traces(mode='lines+markers', connectgaps=False)
-        
-        # ORIGINAL: Calculate y-axis max (higher than highest value)
-        max_data = plot_df[data_column].max()
-        
-        if pd.isna(max_data):
-            max_data = 1
-            
-        # ORIGINAL: For temperature, calculate proper y-axis range
-        if data_type == "Temperature":
-            min_data = plot_df[data_column].min()
-            if not pd.isna(min_data):
-                # If all temperatures are positive, start from 0
-                if min_data >= 0:
-                    y_min = 0
-                    y_max = max_data * 1.2  # 20% padding above max
-                else:
-                    # If there are negative temperatures, add padding below min
-                    y_min = min_data * 1.2  # 20% padding below min (makes it more negative)
-                    y_max = max_data * 1.2  # 20% padding above max
-            else:
-                y_min = 0
-                y_max = 1
-        else:
-            # For rainfall, keep existing logic
-            if max_data == 0:
-                max_data = 1
-            y_min = 0
-            y_max = max_data * 1.2  # 20% padding above max value
-        
-        # ORIGINAL: Add cumulative rainfall line only for rainfall data
-        if show_cumulative:
-            max_cumulative = plot_df['cumulative_rainfall'].max()
-            if pd.isna(max_cumulative) or max_cumulative == 0:
-                max_cumulative = 1
-            y2_max = max_cumulative * 1.2
-            
-            fig.add_scatter(
-                x=plot_df.index, 
-                y=plot_df['cumulative_rainfall'], 
-                mode="lines+markers",
-                name="Cumulative Rainfall", 
-                line=dict(color="#00509E"),  # Original dark blue color
-                yaxis="y2",
-                connectgaps=False  # This ensures gaps are visible in the cumulative line
-            )
-        
-        # ORIGINAL: Update layout - dual y-axis for rainfall, single for temperature
-        if show_cumulative:
-            # ORIGINAL: Dual y-axis layout for rainfall
-            fig.update_layout(
-                yaxis=dict(
-                    title=f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})",
-                    side="left",
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='lightgray',
-                    range=[y_min, y_max]
-                ),
-                yaxis2=dict(
-                    title="Cumulative Rainfall (mm)",
-                    side="right",
-                    overlaying="y",
-                    showgrid=False,
-                    range=[0, y2_max]
-                ),
-                xaxis_title="Date" if view_mode in ["Monthly", "Yearly"] else "Time",
-                height=400,
-                hovermode='x unified',
-                legend=dict(
-                    x=1.08,  # Move legend further right to avoid secondary y-axis
-                    y=0.5,   # Center vertically
-                    xanchor='left',
-                    yanchor='middle'
-                )
-            )
-        else:
-            # ORIGINAL: Single y-axis layout for temperature
-            fig.update_layout(
-                yaxis=dict(
-                    title=f"{data_type} ({'mm' if data_type == 'Rainfall' else '°C'})",
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='lightgray',
-                    range=[y_min, y_max]
-                ),
-                xaxis_title="Date" if view_mode in ["Monthly", "Yearly"] else "Time",
-                height=400,
-                hovermode='x unified'
-            )
-        
-        # ORIGINAL: Special x-axis formatting for different view modes
-        if view_mode == "Monthly":
-            # Show all dates from first to last day of month
-            fig.update_xaxes(
-                dtick="D1",  # Show every day
-                tickformat="%d",  # Show day numbers
-                tickmode="linear",
-                range=[plot_df.index.min(), plot_df.index.max()]  # Limit to actual month range
-            )
-        elif view_mode == "Yearly":
-            # Show all months
-            fig.update_xaxes(
-                dtick="M1",  # Show every month
-                tickformat="%b",  # Show month abbreviations
-                tickmode="linear",
-                range=[plot_df.index.min(), plot_df.index.max()]  # Limit to actual year range
-            )
+        fig = build_figure(plot_df, data_column, data_type, view_mode, time_title)
 
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig, use_container_width=True, key=f"plot_{sensor_id}_{data_type}")
 
         # ---------------------------
         # ORIGINAL: SUMMARY STATS (Only for Rainfall) - DATAFRAME FORMAT
@@ -480,17 +557,14 @@ if selected_file:
             agg_type = None
             if view_mode == "Daily" and 'agg' in locals():
                 agg_type = agg
-            stats = get_summary_stats(filtered_df, view_mode, plot_df, agg_type)
+            stats = get_summary_stats(filtered_df, view_mode, plot_df, agg_type, has_missing=has_missing_data)
             
             if stats is None:
                 # Show warning for incomplete data
                 st.warning("⚠️ Data is incomplete for this period. Summary statistics are not available.")
             else:
                 st.markdown("### 📊 Summary Statistics")
-                # ORIGINAL: Create DataFrame with explicit string dtype to avoid Arrow issues
-                stats_df = pd.DataFrame(stats, index=["Value"]).T
-                stats_df = stats_df.astype(str)  # Ensure all values are strings
-                st.dataframe(stats_df, use_container_width=True)
+                st.markdown(stats_table_html(stats), unsafe_allow_html=True)
 
         # ---------------------------
         # ORIGINAL: DOWNLOAD OPTIONS
@@ -501,10 +575,9 @@ if selected_file:
         html_filename = f"{sensor_id}_{view_mode}_{time_title.replace(' ', '_').replace(',', '').replace(':', '_').replace('(', '').replace(')', '')}.html"
         
         try:
-            html_string = fig.to_html(include_plotlyjs='cdn')
             st.download_button(
                 "📄 Download Interactive HTML Plot", 
-                html_string.encode(), 
+                fig_html_bytes(fig.to_json()), 
                 file_name=html_filename, 
                 mime="text/html",
                 help="Download interactive HTML plot file."
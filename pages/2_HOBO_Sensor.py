@@ -1,9 +1,17 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+import json
 import os
 from datetime import datetime, timedelta
 import base64
+from hobo_data import downcast as _downcast, m4_indices, read_hobo_csv
+
+# orjson (a requirement) serializes figure JSON (and numpy arrays) much faster than stdlib json
+pio.json.config.default_engine = "orjson"
 
 # ---------------------------
 # CONFIGURATION
@@ -15,20 +23,52 @@ HOBO_BASE_PATH = "processed/hobo"
 SENSOR_METADATA_PATH = "processed/sensor_metadata/sensor_metadata.csv"
 LOGO_PATH = "assets/logo_1.png"
 
+# Above this many points a parameter is thinned with M4 before it is plotted
+MAX_PLOT_POINTS = 5000
+
+# psi -> kPa (6.89476) -> metres of water (/ 98.0665), folded into one factor
+PSI_TO_M_WATER = np.float32(6.89476 / 98.0665)
+
 # ---------------------------
 # UTILITY FUNCTIONS
 # ---------------------------
-@st.cache_data
+def _read_parquet_copy(file_path):
+    """Return the parsed frame saved next to the CSV, or None if missing or stale"""
+    pq_path = file_path + '.parquet'
+    try:
+        if os.path.getmtime(pq_path) >= os.path.getmtime(file_path):
+            return pd.read_parquet(pq_path)
+    except (OSError, ImportError, ValueError):
+        pass
+    return None
+
+def _write_parquet_copy(df, file_path):
+    """Save the parsed frame as Parquet so the next cold start skips CSV parsing"""
+    pq_path = file_path + '.parquet'
+    tmp_path = pq_path + '.tmp'
+    try:
+        df.to_parquet(tmp_path, compression='zstd')
+        os.replace(tmp_path, pq_path)
+    except (OSError, ImportError, ValueError):
+        # Read-only checkout or no pyarrow: keep serving from the CSV
+        pass
+
+# The parsed frame is served by reference: cache_data would pickle and copy the whole
+# frame on every rerun. Callers must not modify it in place (see water_level_m below)
+@st.cache_resource
 def load_csv(file_path):
-    df = pd.read_csv(file_path)
-    # All timestamps now standardized to YYYY-MM-DD HH:MM:SS format
-    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-    df.dropna(subset=['timestamp'], inplace=True)
-    df.set_index('timestamp', inplace=True)
-    df.sort_index(inplace=True)
+    df = _read_parquet_copy(file_path)
+    # An empty copy can only come from a bad parse; fall through and rebuild it from the CSV
+    if df is not None and not df.empty:
+        # Copies written before the downcast still hold float64
+        return _downcast(df)
+    
+    df = read_hobo_csv(file_path)
+    if not df.empty:
+        _write_parquet_copy(df, file_path)
     return df
 
-@st.cache_data
+@st.cache_resource
 def load_metadata_csv(file_path):
     """Load metadata CSV"""
     try:
@@ -38,21 +78,27 @@ def load_metadata_csv(file_path):
         return pd.DataFrame()
 
 @st.cache_data
-def encode_img_to_base64(image_path):
+def load_sensor_heights(file_path):
+    """Map sensor_id -> sensor_height_m, built once from the metadata CSV"""
+    metadata_df = load_metadata_csv(file_path)
+    if metadata_df.empty:
+        return {}
+    return dict(zip(metadata_df['sensor_id'].astype(str), metadata_df['sensor_height_m'].astype(float)))
+
+@st.cache_resource
+def header_html(image_path):
+    """Build the page header markup once per process; text-only if the logo is missing"""
     try:
         with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
+            logo_base64 = base64.b64encode(f.read()).decode()
     except FileNotFoundError:
-        # Return empty string if logo not found
-        return ""
-
-# ---------------------------
-# HEADER SECTION
-# ---------------------------
-logo_base64 = encode_img_to_base64(LOGO_PATH)
-
-if logo_base64:
-    st.markdown(f"""
+        return """
+        <div style='padding: 20px 10px 10px 10px;'>
+            <h1 style='margin-bottom: 0;'>🌡️ S4W Sensor Dashboard - HOBO Sensor</h1>
+            <p style='margin-top: 5px; color: gray;font-size: 18px; font-weight: 500;'>From small sensors to big insights — monitor what matters ❤️</p>
+        </div>
+    """
+    return f"""
         <div style='display: flex; justify-content: space-between; align-items: center; padding: 20px 10px 10px 10px;'>
             <div>
                 <h1 style='margin-bottom: 0;'>🌡️ S4W Sensor Dashboard - HOBO Sensor</h1>
@@ -62,14 +108,40 @@ if logo_base64:
                 <img src='data:image/png;base64,{logo_base64}' style='height:100px;'/>
             </div>
         </div>
-    """, unsafe_allow_html=True)
-else:
-    st.markdown("""
-        <div style='padding: 20px 10px 10px 10px;'>
-            <h1 style='margin-bottom: 0;'>🌡️ S4W Sensor Dashboard - HOBO Sensor</h1>
-            <p style='margin-top: 5px; color: gray;font-size: 18px; font-weight: 500;'>From small sensors to big insights — monitor what matters ❤️</p>
-        </div>
-    """, unsafe_allow_html=True)
+    """
+
+@st.cache_data(max_entries=32)
+def fig_html_bytes(fig_json):
+    """Standalone HTML for a figure, rendered once per distinct figure JSON"""
+    # The JSON came from a validated figure, so skip re-validating it
+    return pio.to_html(json.loads(fig_json), include_plotlyjs='cdn', validate=False).encode()
+
+@st.cache_data(ttl=60)
+def list_sites(base_path):
+    """List site folders; scandir's d_type avoids a stat() per entry"""
+    return [e.name for e in os.scandir(base_path) if e.is_dir(follow_symlinks=False) and not e.name.startswith('.')]
+
+@st.cache_data(ttl=60)
+def list_csvs(site_path):
+    """List CSV files in a site folder"""
+    return [e.name for e in os.scandir(site_path) if e.name.endswith('.csv') and not e.name.startswith('.')]
+
+@st.cache_data
+def week_bins(file_path):
+    """Monday starting every week that holds at least one reading, computed once instead of per rerun"""
+    # Left-labelled, left-closed bins so each label is exactly the start of the [Mon, next Mon) window the page slices
+    counts = load_csv(file_path).resample('W-MON', label='left', closed='left').size()
+    return counts[counts > 0].index
+
+@st.cache_data
+def month_bins(file_path):
+    """Start of every month that holds at least one reading"""
+    return load_csv(file_path).index.to_period('M').unique().to_timestamp()
+
+# ---------------------------
+# HEADER SECTION
+# ---------------------------
+st.markdown(header_html(LOGO_PATH), unsafe_allow_html=True)
 
 # ---------------------------
 # SITE & FILE SELECTION
@@ -77,7 +149,7 @@ else:
 
 try:
     # Get available sites from local processed folder
-    sites = [d for d in os.listdir(HOBO_BASE_PATH) if os.path.isdir(os.path.join(HOBO_BASE_PATH, d)) and not d.startswith('.')]
+    sites = list_sites(HOBO_BASE_PATH)
     
     if not sites:
         st.error("🔍 No HOBO sensor sites found in the processed/hobo folder.")
@@ -87,7 +159,7 @@ try:
     
     # Get CSV files in selected site
     site_path = os.path.join(HOBO_BASE_PATH, selected_site)
-    csv_files = [f for f in os.listdir(site_path) if f.endswith('.csv') and not f.startswith('.')]
+    csv_files = list_csvs(site_path)
     
     if not csv_files:
         st.error(f"📁 No CSV files found in {selected_site}")
@@ -112,24 +184,25 @@ if selected_file:
         st.error("Failed to load data or data is empty")
         st.stop()
     
-    # Load metadata if available
-    metadata_df = load_metadata_csv(SENSOR_METADATA_PATH)
+    # Load sensor heights from metadata if available
+    sensor_heights = load_sensor_heights(SENSOR_METADATA_PATH)
     
     # Extract sensor information
     sensor_id = selected_file.split(".")[0]  # e.g., hobo_s1_2023
     
     # Get sensor height from metadata for water level calculation
-    sensor_height = 0.0
-    if not metadata_df.empty:
-        metadata_df['sensor_id'] = metadata_df['sensor_id'].astype(str)
-        sensor_row = metadata_df[metadata_df['sensor_id'].str.contains(sensor_id)]
-        sensor_height = sensor_row['sensor_height_m'].values[0] if not sensor_row.empty else 0.0
+    sensor_height = sensor_heights.get(sensor_id)
+    if sensor_height is None:
+        # Fall back to a partial match for metadata ids that extend the file name
+        sensor_height = next((h for sid, h in sensor_heights.items() if sensor_id in sid), 0.0)
 
     # Calculate water level from pressure if not available (ORIGINAL HOBO FEATURE)
     if 'water_level_m' not in df.columns and 'pressure_psi' in df.columns:
         # Convert pressure from psi to water level in meters
         # Formula: pressure_psi * 6.89476 (convert to kPa) / 98.0665 (convert to m) + sensor height
-        df['water_level_m'] = ((df['pressure_psi'] * 6.89476) / 98.0665) + sensor_height
+        pressure = df['pressure_psi'].to_numpy(np.float32)
+        # assign() keeps the shared cached frame untouched
+        df = df.assign(water_level_m=pressure * PSI_TO_M_WATER + np.float32(sensor_height))
     
     # ---------------------------
     # SIDEBAR CONTROLS - UNIQUE HOBO DESIGN
@@ -154,7 +227,7 @@ if selected_file:
         
     # Add any other numeric columns as potential parameters
     for col in df.columns:
-        if col not in available_params and df[col].dtype in ['float64', 'int64']:
+        if col not in available_params and (pd.api.types.is_float_dtype(df[col]) or pd.api.types.is_integer_dtype(df[col])):
             available_params.append(col)
             param_display[col] = col.replace('_', ' ').title()
     
@@ -169,9 +242,12 @@ if selected_file:
     # Default to water_level_m if available, otherwise pressure_psi, otherwise first parameter
     default_param = 'water_level_m' if 'water_level_m' in available_params else ('pressure_psi' if 'pressure_psi' in available_params else available_params[0])
     
-    for param in available_params:
-        if st.sidebar.checkbox(param_display[param], param == default_param):
-            selected_params.append(param)
+    # Checkboxes sit in a form so ticking several of them costs one rerun, not one each
+    with st.sidebar.form("parameter_form"):
+        for param in available_params:
+            if st.checkbox(param_display[param], param == default_param):
+                selected_params.append(param)
+        st.form_submit_button("Apply")
     
     st.sidebar.markdown("### 🗓️ Time Range")
     view_mode = st.sidebar.radio("View by:", ["Daily", "Weekly", "Monthly", "Custom"])
@@ -180,10 +256,13 @@ if selected_file:
     max_date = df.index.max()
     
     if view_mode == "Custom":
-        start = st.sidebar.date_input("Start Date", min_value=min_date.date(), value=min_date.date())
-        end = st.sidebar.date_input("End Date", min_value=min_date.date(), value=max_date.date())
-        mask = (df.index.date >= start) & (df.index.date <= end)
-        filtered_df = df[mask]
+        # Both dates are submitted together instead of rerunning after each one
+        with st.sidebar.form("custom_range_form"):
+            start = st.date_input("Start Date", min_value=min_date.date(), value=min_date.date())
+            end = st.date_input("End Date", min_value=min_date.date(), value=max_date.date())
+            st.form_submit_button("Apply")
+        # The index is sorted, so .loc slices by binary search; the end day is inclusive
+        filtered_df = df.loc[pd.Timestamp(start):pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')]
         time_title = f"{start.strftime('%b %d, %Y')} to {end.strftime('%b %d, %Y')}"
     else:
         if view_mode == "Daily":
@@ -198,20 +277,18 @@ if selected_file:
             selected_bin = pd.Timestamp(selected_date)
             delta = timedelta(days=1)
         elif view_mode == "Weekly":
-            bins = df.resample('W-MON').mean().index
+            bins = week_bins(file_path)
             selected_bin = st.sidebar.selectbox("📆 Select week:", bins)
             delta = timedelta(weeks=1)
         else:  # Monthly
             # Show all months that have timestamps (TB Sensor format)
-            monthly_groups = df.groupby(pd.Grouper(freq='MS')).size()
-            bins = monthly_groups[monthly_groups > 0].index
-            bin_options = [f"{bin.strftime('%Y %B')}" for bin in bins]
-            selected_bin_str = st.sidebar.selectbox("📆 Select month:", bin_options)
-            selected_bin = bins[bin_options.index(selected_bin_str)]
+            bins = month_bins(file_path)
+            bin_options = {bin.strftime('%Y %B'): bin for bin in bins}
+            selected_bin = bin_options[st.sidebar.selectbox("📆 Select month:", list(bin_options))]
             delta = pd.DateOffset(months=1)
 
         selected_end = selected_bin + delta
-        filtered_df = df[(df.index >= selected_bin) & (df.index < selected_end)]
+        filtered_df = df.loc[selected_bin:selected_end - pd.Timedelta(1, 'ns')]
 
         if view_mode == "Monthly":
             time_title = selected_bin.strftime("%B %Y")
@@ -230,8 +307,12 @@ if selected_file:
         st.warning("Please select at least one parameter.")
     else:
         for param in selected_params:
+            plot_df = filtered_df
+            if len(filtered_df) > MAX_PLOT_POINTS:
+                # M4 keeps every peak and trough at chart width while ~4 points per pixel reach the browser
+                plot_df = filtered_df.iloc[m4_indices(filtered_df.index, filtered_df[param].to_numpy(np.float64))]
             fig = px.line(
-                filtered_df,
+                plot_df,
                 y=param,
                 title=f"{param_display[param]} ({time_title})",
                 labels={"value": param_display[param]},
@@ -241,15 +322,19 @@ if selected_file:
             
             # Let plotly handle y-axis range automatically for best visualization
             fig.update_layout(xaxis_title=xaxis_title, yaxis_title=param_display[param], height=400)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(fig, use_container_width=True, key=f"plot_{sensor_id}_{param}")
+
+            # The chart may show the M4-thinned line; the downloaded HTML keeps every sample
+            export_fig = fig
+            if plot_df is not filtered_df:
+                export_fig = go.Figure(fig).update_traces(x=filtered_df.index, y=filtered_df[param].to_numpy())
 
             # HTML Download functionality
             html_filename = f"{sensor_id}_{view_mode}_{param}.html"
             try:
-                html_string = fig.to_html(include_plotlyjs='cdn')
                 st.download_button(
                     f"📄 Download {param_display[param]} as HTML",
-                    html_string.encode(), 
+                    fig_html_bytes(export_fig.to_json()), 
                     file_name=html_filename, 
                     mime="text/html",
                     key=f"html_{param}",
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+build_hobo_parquet.py
+
+Description:
+    Writes the Parquet copy that pages/2_HOBO_Sensor.py reads in place of each
+    processed HOBO CSV:
+        processed/hobo/{site}/{file}.csv -> processed/hobo/{site}/{file}.csv.parquet
+    The copy holds the frame exactly as load_csv caches it (timestamp index,
+    sorted, second resolution, float32 readings), so the dashboard's first load
+    of a file skips CSV parsing. Run it after new CSVs are prepared and commit
+    the copies with them (.gitignore lets processed/hobo copies through); a
+    copy older than its CSV is ignored by the page and rebuilt on the next run.
+
+Usage:
+    Run from the repository root:
+        python3 scripts/build_hobo_parquet.py
+"""
+
+import sys
+from pathlib import Path
+
+# Parse with the dashboard's own code so the copies match what load_csv would cache
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from hobo_data import read_hobo_csv
+
+HOBO_BASE = Path("processed/hobo")
+
+# Row groups of this many readings keep the per-group min/max statistics useful
+ROW_GROUP_SIZE = 50_000
+
+def build_parquet(csv_path):
+    df = read_hobo_csv(csv_path)
+    if df.empty:
+        # The page would prefer an empty copy over the CSV, so never write one
+        return None, 0
+
+    pq_path = csv_path.with_name(csv_path.name + '.parquet')
+    df.to_parquet(pq_path, engine='pyarrow', compression='zstd', row_group_size=ROW_GROUP_SIZE)
+    return pq_path, len(df)
+
+if __name__ == "__main__":
+    csv_files = sorted(HOBO_BASE.glob("**/*.csv"))
+    if not csv_files:
+        print(f"⚠️ No CSV files found under {HOBO_BASE}")
+    for csv_path in csv_files:
+        pq_path, rows = build_parquet(csv_path)
+        if pq_path is None:
+            print(f"⚠️ {csv_path}: no readable timestamps, Parquet copy not written")
+        else:
+            print(f"✅ {csv_path} -> {pq_path.name} ({rows} rows)")